@@ -1,15 +1,26 @@
 """
 Enhanced flight booking agent with bulk date range searching
+
+Response parsing and formatting (baggage, segments, response text) is dict/string
+work over heterogeneous Travelport JSON with no numeric kernel, so it is kept in
+plain Python and tuned by cutting lookups and allocations; JIT compilers such as
+Numba do not help here (typed dicts of strings are slower than CPython dicts).
 """
 
-import json
-import requests
-from datetime import datetime, timedelta
-from typing import Dict, Optional, List, Tuple
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import logging
+import re
+from datetime import date, datetime, timedelta
+from typing import Dict, FrozenSet, Iterator, Optional, List, Tuple
+from operator import itemgetter
+from functools import lru_cache, partial
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import deque
+import os
+import threading
 import time
 from dotenv import load_dotenv
 from hashlib import sha1
+from uuid import uuid4
 
 # LangGraph and LangChain imports
 from langgraph.graph import StateGraph, END
@@ -18,40 +29,71 @@ from langchain_openai import ChatOpenAI
 from langchain_google_genai import ChatGoogleGenerativeAI
 
 # Local imports
-from ..models.schemas import FlightBookingState
-from ..api.travelport import get_api_headers, CATALOG_URL
+from ..models.schemas import FlightBookingState, LayoverDetail, ParsedTravelRequest
+from ..api.travelport import get_api_headers, post_catalog_search
 from ..payloads.flight_search import build_flight_search_payload
+from ..services.ttl_cache import TTLCache
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 llm = ChatGoogleGenerativeAI(model="gemini-2.5-pro", temperature=0)
 # Initialize LLM
 # llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
 
-
-def parse_travel_request(state: FlightBookingState) -> FlightBookingState:
-    """Enhanced parsing with better round-trip detection and duration calculation"""
-    
-    today = datetime.now().strftime("%Y-%m-%d")
-    tomorrow = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
-    
-    # Include conversation context if available
-    context_section = ""
-    if state.get("conversation_context"):
-        context_section = f"\nPrevious conversation context:\n{state['conversation_context']}\n"
-    
-    current_year = datetime.now().year
-    current_month = datetime.now().month
-    
-    parsing_prompt = f"""
-    Today's date is {today} (Current year: {current_year}). Extract flight booking details from this user message: "{state['user_message']}"
+# Bulk search concurrency and Travelport rate limiting
+BULK_SEARCH_MAX_WORKERS = 8
+BULK_SEARCH_MAX_DATES = 15  # Uniform sampling cap; longer ranges use the adaptive search
+ADAPTIVE_SEARCH_ROUNDS = 2  # Batches of concurrent probes per adaptive search (2 keeps pace with uniform sampling)
+RATE_LIMIT_CALLS = 8  # Max Travelport calls per window
+RATE_LIMIT_PERIOD = 1.0  # Window length in seconds
+
+_rate_limit_lock = threading.Lock()
+_rate_limit_calls: deque = deque()
+
+# One bounded pool shared by every search fan-out, so concurrent conversations (and the
+# adaptive search's repeated probes) queue for the same workers instead of each spawning their own
+_search_executor = ThreadPoolExecutor(max_workers=BULK_SEARCH_MAX_WORKERS, thread_name_prefix="travelport-search")
+
+# LRU cache of decoded LLM parse output, keyed by (today, normalized message, normalized context)
+PARSE_CACHE_MAXSIZE = 4096
+_parse_cache = TTLCache(maxsize=PARSE_CACHE_MAXSIZE)
+_CACHE_NORMALIZE_EMOJI_RE = re.compile("[\U0001F000-\U0001FAFF\u2600-\u27BF\uFE0F]")
+_CACHE_NORMALIZE_SPACE_RE = re.compile(r"\s+")
+
+# Airfares move slowly, so identical catalog searches are reused for a while.
+# Set DISABLE_FLIGHT_SEARCH_CACHE=1 to always hit the API (e.g. when testing).
+SEARCH_CACHE_TTL = 900  # seconds
+SEARCH_CACHE_DISABLED = os.getenv("DISABLE_FLIGHT_SEARCH_CACHE", "").lower() in ("1", "true", "yes")
+# Cached responses are shared between conversations and must never be mutated in place.
+_search_cache = TTLCache(maxsize=4096, ttl=SEARCH_CACHE_TTL)
+# Searches currently being fetched, so identical concurrent misses share one API call
+_search_inflight: Dict[tuple, Future] = {}
+_search_inflight_lock = threading.Lock()
+
+# (price, offering, ProductBrandOption, ProductBrandOffering) for one priced brand. Carrying the option
+# and brand along lets the details extraction skip re-scanning the offering for its cheapest price.
+PricedBrand = Tuple[float, Optional[Dict], Optional[Dict], Optional[Dict]]
+_UNPRICED: PricedBrand = (float('inf'), None, None, None)
+
+
+def normalize_for_parse_cache(text: str) -> str:
+    """Normalize text for parse-cache keys: lowercase, drop emoji, collapse whitespace"""
+    text = _CACHE_NORMALIZE_EMOJI_RE.sub("", (text or "").lower())
+    return _CACHE_NORMALIZE_SPACE_RE.sub(" ", text).strip()
+
+
+# Parsing prompt, filled per request with str.format (JSON braces are doubled)
+_PARSING_PROMPT_TEMPLATE = """
+    Today's date is {today} (Current year: {current_year}). Extract flight booking details from this user message: "{user_message}"
     {context_section}
     
     Pay special attention to round-trip requests and duration-based bookings.
     
     CRITICAL DATE PARSING RULE:
     - ALWAYS use the current year ({current_year}) for dates unless explicitly stated otherwise
-    - If a month has already passed this year, use NEXT year ({current_year + 1})
+    - If a month has already passed this year, use NEXT year ({next_year})
     - Examples: "4 نومبر" = November 4, {current_year} (current year is 2025)
     - "چار نومبر" = November 4, {current_year}  
     - Never default to past years like 2023 or 2024
@@ -61,7 +103,7 @@ def parse_travel_request(state: FlightBookingState) -> FlightBookingState:
     {{
         "from_city": "3-letter airport code or null",
         "to_city": "3-letter airport code or null", 
-        "departure_date": "YYYY-MM-DD format or null (ALWAYS use {current_year} or {current_year + 1})",
+        "departure_date": "YYYY-MM-DD format or null (ALWAYS use {current_year} or {next_year})",
         "return_date": "YYYY-MM-DD format or null (for return flights)",
         "passengers": "number of passengers (default 1)",
         "passenger_age": "age of passenger (default 25)",
@@ -82,7 +124,7 @@ def parse_travel_request(state: FlightBookingState) -> FlightBookingState:
     - Use standard 3-letter IATA codes (KHI=Karachi, DXB=Dubai, LHE=Lahore, MXP=Milan)
     
     Duration calculation examples:
-    - "leaving tomorrow for 5 days" → departure: {tomorrow}, return: {(datetime.now() + timedelta(days=6)).strftime("%Y-%m-%d")}
+    - "leaving tomorrow for 5 days" → departure: {tomorrow}, return: {six_days_later}
     - "round trip for a week" → return date = departure + 7 days
     - "going for 3 days" with departure Aug 7 → return Aug 10
     
@@ -92,27 +134,123 @@ def parse_travel_request(state: FlightBookingState) -> FlightBookingState:
         "from_city": "KHI", 
         "to_city": "DXB", 
         "departure_date": "{tomorrow}",
-        "return_date": "{(datetime.now() + timedelta(days=6)).strftime("%Y-%m-%d")}",
+        "return_date": "{six_days_later}",
         "trip_type": "round-trip",
         "duration_days": 5,
         "search_type": "specific"
     }}
     """
+
+
+def collect_streamed_json(chunks) -> str:
+    """Accumulate streamed LLM chunks, stopping as soon as the first top-level JSON object closes.
+    Returns the text from the opening "{" to its matching "}", or everything received if no
+    complete object arrived (the caller's fence cleanup and JSON decoding then handle it).
+    """
+    
+    parts: List[str] = []
+    received = 0
+    start = None
+    depth = 0
+    in_string = False
+    escaped = False
     
     try:
-        print(f"🤖 Enhanced round-trip parsing for: {state['user_message']}")
-        response = llm.invoke([HumanMessage(content=parsing_prompt)])
-        content = response.content if isinstance(response.content, str) else str(response.content)
-        
-        # Clean the response
-        content = content.strip()
-        if content.startswith("```json"):
-            content = content[7:]
-        if content.endswith("```"):
-            content = content[:-3]
-        content = content.strip()
+        for chunk in chunks:
+            text = chunk.content if isinstance(chunk.content, str) else str(chunk.content)
+            parts.append(text)
+            
+            for offset, char in enumerate(text):
+                if start is None:
+                    if char == "{":
+                        start = received + offset
+                        depth = 1
+                    continue
+                
+                if in_string:
+                    if escaped:
+                        escaped = False
+                    elif char == "\\":
+                        escaped = True
+                    elif char == '"':
+                        in_string = False
+                elif char == '"':
+                    in_string = True
+                elif char == "{":
+                    depth += 1
+                elif char == "}":
+                    depth -= 1
+                    if depth == 0:
+                        return "".join(parts)[start:received + offset + 1]
+            
+            received += len(text)
+    finally:
+        # Closing the generator cancels the rest of the stream
+        close = getattr(chunks, "close", None)
+        if close:
+            close()
+    
+    return "".join(parts)
+
+
+# Strips optional ``` / ```json fences (any case) and surrounding whitespace; always matches
+_JSON_FENCE_RE = re.compile(r"\s*(?:```(?:json)?)?\s*(.*?)\s*(?:```)?\s*", re.DOTALL | re.IGNORECASE)
+
+
+def parse_travel_request(state: FlightBookingState) -> FlightBookingState:
+    """Enhanced parsing with better round-trip detection and duration calculation"""
+    
+    now = datetime.now()
+    today = now.strftime("%Y-%m-%d")
+    
+    
+    try:
+        # Relative dates ("tomorrow") depend on today, so it is part of the cache key
+        cache_key = (
+            today,
+            normalize_for_parse_cache(state["user_message"]),
+            normalize_for_parse_cache(state.get("conversation_context") or "")
+        )
         
-        parsed_data = json.loads(content)
+        # Simple self-contained requests skip the LLM entirely; context needs the LLM to merge
+        fast_parsed = None if state.get("conversation_context") else try_fast_parse(state["user_message"])
+        cached = None if fast_parsed else _parse_cache.get(cache_key)
+        
+        if fast_parsed:
+            logger.debug("⚡ Fast-path parse for: %s", state['user_message'])
+            parsed_data = fast_parsed
+        elif cached is not None:
+            logger.debug("⚡ Parse cache hit for: %s", state['user_message'])
+            # Copy: the round-trip handling below fills in fields on parsed_data
+            parsed_data = dict(cached)
+        else:
+            logger.debug("🤖 Enhanced round-trip parsing for: %s", state['user_message'])
+            # Include conversation context if available
+            context_section = ""
+            if state.get("conversation_context"):
+                context_section = f"\nPrevious conversation context:\n{state['conversation_context']}\n"
+            
+            parsing_prompt = _PARSING_PROMPT_TEMPLATE.format(
+                today=today,
+                tomorrow=(now + timedelta(days=1)).strftime("%Y-%m-%d"),
+                six_days_later=(now + timedelta(days=6)).strftime("%Y-%m-%d"),
+                current_year=now.year,
+                next_year=now.year + 1,
+                user_message=state["user_message"],
+                context_section=context_section
+            )
+            
+            # Stream so we can stop reading as soon as the JSON object is complete. This is why the reply is
+            # not requested through llm.with_structured_output(ParsedTravelRequest): that waits for the
+            # whole response, and the fence strip below stays as the fallback for free-form replies.
+            content = collect_streamed_json(llm.stream([HumanMessage(content=parsing_prompt)]))
+            
+            # Clean the response, then decode and validate it against the schema in one pass
+            # (odd optional values are coerced or dropped by the schema rather than failing the parse)
+            parsed_data = ParsedTravelRequest.model_validate_json(
+                _JSON_FENCE_RE.fullmatch(content).group(1)
+            ).model_dump()
+            _parse_cache.set(cache_key, dict(parsed_data))
         
         # Enhanced return date calculation for round-trips
         if parsed_data.get("trip_type") == "round-trip":
@@ -121,14 +259,14 @@ def parse_travel_request(state: FlightBookingState) -> FlightBookingState:
                     dep_date = datetime.strptime(parsed_data["departure_date"], "%Y-%m-%d")
                     return_date = dep_date + timedelta(days=int(parsed_data["duration_days"]))
                     parsed_data["return_date"] = return_date.strftime("%Y-%m-%d")
-                    print(f"✅ Calculated return date: {parsed_data['return_date']} (departure + {parsed_data['duration_days']} days)")
+                    logger.debug("✅ Calculated return date: %s (departure + %s days)", parsed_data['return_date'], parsed_data['duration_days'])
                 except Exception as e:
-                    print(f"⚠️ Error calculating return date: {e}")
+                    logger.warning("⚠️ Error calculating return date: %s", e)
             
             # Ensure search_type is specific for round-trips with exact dates
             if parsed_data.get("departure_date") and parsed_data.get("return_date"):
                 parsed_data["search_type"] = "specific"
-                print(f"✅ Round-trip detected: {parsed_data['departure_date']} to {parsed_data['return_date']}")
+                logger.debug("✅ Round-trip detected: %s to %s", parsed_data['departure_date'], parsed_data['return_date'])
         
         # Update state with parsed information
         state.update({
@@ -146,26 +284,34 @@ def parse_travel_request(state: FlightBookingState) -> FlightBookingState:
             "range_description": parsed_data.get("range_description")
         })
         
-        print(f"✅ Enhanced parsing result: {parsed_data}")
+        logger.debug("✅ Enhanced parsing result: %s", parsed_data)
         
     except Exception as e:
-        print(f"❌ Enhanced parsing error: {e}")
+        logger.error("❌ Enhanced parsing error: %s", e)
         state["response_text"] = "😅 I couldn't understand your flight request. Please provide details like: from city, to city, and travel dates."
     
     return state
 
+# Pattern for "between X to Y", "between X and Y" or "from X to Y"
+_DATE_RANGE_RE = re.compile(
+    r'(?:between|from)\s+(\d{1,2})(?:st|nd|rd|th)?\s+(?:to|and|-)\s+(\d{1,2})(?:st|nd|rd|th)?\s+(\w+)'
+)
+_MONTH_MAP = {
+    'january': 1, 'jan': 1, 'february': 2, 'feb': 2, 'march': 3, 'mar': 3,
+    'april': 4, 'apr': 4, 'may': 5, 'june': 6, 'jun': 6,
+    'july': 7, 'jul': 7, 'august': 8, 'aug': 8, 'september': 9, 'sep': 9,
+    'october': 10, 'oct': 10, 'november': 11, 'nov': 11, 'december': 12, 'dec': 12
+}
+
+
 # Add this helper function
 def extract_date_range_manually(message: str) -> dict:
     """Manual fallback for date range extraction"""
-    import re
-    from datetime import datetime, timedelta
     
     message_lower = message.lower()
     current_year = datetime.now().year
     
-    # Pattern for "between X to Y" or "from X to Y"
-    date_pattern = r'(?:between|from)\s+(\d{1,2})(?:st|nd|rd|th)?\s+to\s+(\d{1,2})(?:st|nd|rd|th)?\s+(\w+)'
-    match = re.search(date_pattern, message_lower)
+    match = _DATE_RANGE_RE.search(message_lower)
     
     if match:
         start_day = int(match.group(1))
@@ -173,14 +319,7 @@ def extract_date_range_manually(message: str) -> dict:
         month_name = match.group(3)
         
         # Convert month name to number
-        month_map = {
-            'january': 1, 'jan': 1, 'february': 2, 'feb': 2, 'march': 3, 'mar': 3,
-            'april': 4, 'apr': 4, 'may': 5, 'june': 6, 'jun': 6,
-            'july': 7, 'jul': 7, 'august': 8, 'aug': 8, 'september': 9, 'sep': 9,
-            'october': 10, 'oct': 10, 'november': 11, 'nov': 11, 'december': 12, 'dec': 12
-        }
-        
-        month_num = month_map.get(month_name.lower(), 8)  # Default to August
+        month_num = _MONTH_MAP.get(month_name, 8)  # Default to August
         
         try:
             start_date = f"{current_year}-{month_num:02d}-{start_day:02d}"
@@ -198,117 +337,479 @@ def extract_date_range_manually(message: str) -> dict:
     return {}
 
 
+# Compact city name → IATA map for the deterministic fast-path parser
+CITY_TO_IATA = {
+    "karachi": "KHI", "lahore": "LHE", "islamabad": "ISB", "peshawar": "PEW",
+    "multan": "MUX", "quetta": "UET", "sialkot": "SKT",
+    "dubai": "DXB", "abu dhabi": "AUH", "sharjah": "SHJ", "doha": "DOH",
+    "muscat": "MCT", "riyadh": "RUH", "jeddah": "JED", "istanbul": "IST",
+    "london": "LON", "paris": "PAR", "milan": "MXP", "rome": "ROM",
+    "athens": "ATH", "frankfurt": "FRA", "amsterdam": "AMS", "madrid": "MAD",
+    "barcelona": "BCN", "munich": "MUC", "zurich": "ZRH", "stockholm": "ARN",
+    "new york": "NYC", "toronto": "YYZ", "bangkok": "BKK", "singapore": "SIN",
+    "kuala lumpur": "KUL", "delhi": "DEL", "mumbai": "BOM", "manchester": "MAN",
+}
+_KNOWN_IATA_CODES = frozenset(CITY_TO_IATA.values())
+
+# Longest names first so "abu dhabi" wins over shorter overlaps
+_FAST_PARSE_PLACE = "|".join(
+    re.escape(name) for name in sorted(
+        set(CITY_TO_IATA) | {code.lower() for code in _KNOWN_IATA_CODES}, key=len, reverse=True
+    )
+)
+# A single departure date: ISO "2025-09-15" or day-first "15th september"
+_FAST_PARSE_DATE_RE = re.compile(r"\b(?:(\d{4})-(\d{2})-(\d{2})|(\d{1,2})(?:st|nd|rd|th)?\s+([a-z]+))\b")
+# The only words the fast path may skip; anything else (passengers, cabin class, alternatives,
+# return legs, relative dates...) needs the LLM
+_FAST_PARSE_FILLER = r"(?:on|for|in|the|please|one[- ]?way)"
+# The whole message must be [fly|flights] [from] <place> to <place> <date or range>, with filler words
+# allowed around the dates only
+_FAST_PARSE_REQUEST_RE = re.compile(
+    rf"(?:please\s+)?(?:(?:fly|flights?)\s+)?(?:from\s+)?(?P<origin>{_FAST_PARSE_PLACE})\s+to\s+(?P<destination>{_FAST_PARSE_PLACE})"
+    rf"(?:\s+{_FAST_PARSE_FILLER})*\s+(?:(?P<range>{_DATE_RANGE_RE.pattern})|(?P<date>{_FAST_PARSE_DATE_RE.pattern}))"
+    rf"(?:\s+{_FAST_PARSE_FILLER})*[\s.!]*"
+)
+
+
+def to_iata_code(place: str) -> Optional[str]:
+    """Resolve a fast-path place match (city name or known code) to an IATA code"""
+    place = place.lower()
+    if place in CITY_TO_IATA:
+        return CITY_TO_IATA[place]
+    code = place.upper()
+    return code if code in _KNOWN_IATA_CODES else None
+
+
+def try_fast_parse(message: str) -> Optional[dict]:
+    """Deterministic parse of simple one-way requests: a date range, e.g.
+    "ATH to ISB between 15th and 20th August", or a single date, e.g. "KHI to DXB on 2025-09-15".
+    Only a message made up entirely of route and dates (plus a few filler words) is parsed;
+    anything else in it (passengers, cabin class, round trips, relative dates...) returns None
+    so the LLM handles it.
+    """
+    
+    # Emoji are decoration, never part of the request
+    message_lower = _CACHE_NORMALIZE_EMOJI_RE.sub(" ", message.lower()).strip()
+    
+    request_match = _FAST_PARSE_REQUEST_RE.fullmatch(message_lower)
+    if not request_match:
+        return None
+    
+    from_place, to_place, range_text, date_text = request_match.group("origin", "destination", "range", "date")
+    from_city = to_iata_code(from_place)
+    to_city = to_iata_code(to_place)
+    if not from_city or not to_city or from_city == to_city:
+        return None
+    
+    range_match = _DATE_RANGE_RE.fullmatch(range_text) if range_text else None
+    
+    if not range_match:
+        departure = fast_parse_departure_date(_FAST_PARSE_DATE_RE.fullmatch(date_text))
+        if departure is None:
+            return None
+        return {
+            "from_city": from_city,
+            "to_city": to_city,
+            "departure_date": departure.isoformat(),
+            "return_date": None,
+            "passengers": 1,
+            "passenger_age": 25,
+            "search_type": "specific",
+            "trip_type": "one-way",
+            "duration_days": None,
+            "date_range_start": None,
+            "date_range_end": None,
+            "range_description": None
+        }
+    
+    if range_match.group(3) not in _MONTH_MAP:
+        return None
+    
+    date_range = extract_date_range_manually(range_text)
+    
+    try:
+        start = datetime.strptime(date_range["date_range_start"], "%Y-%m-%d")
+        end = datetime.strptime(date_range["date_range_end"], "%Y-%m-%d")
+    except ValueError:
+        return None
+    
+    if end < start:
+        return None
+    
+    # Months that have already passed roll over to next year (same rule the LLM prompt uses);
+    # a range that is already under way only keeps the days that can still be searched
+    today = date.today()
+    if end.date() < today:
+        try:
+            start = start.replace(year=start.year + 1)
+            end = end.replace(year=end.year + 1)
+        except ValueError:
+            return None
+    elif start.date() < today:
+        start = datetime.combine(today, start.time())
+    
+    return {
+        "from_city": from_city,
+        "to_city": to_city,
+        "departure_date": None,
+        "return_date": None,
+        "passengers": 1,
+        "passenger_age": 25,
+        "search_type": "range",
+        "trip_type": "one-way",
+        "duration_days": None,
+        "date_range_start": start.strftime("%Y-%m-%d"),
+        "date_range_end": end.strftime("%Y-%m-%d"),
+        "range_description": date_range["range_description"]
+    }
+
+
+def fast_parse_departure_date(match: "re.Match[str]") -> Optional[date]:
+    """Resolve a _FAST_PARSE_DATE_RE match to a date that is today or later, or None.
+    Day-month dates that have already passed roll over to next year; past ISO dates are left to the LLM.
+    """
+    today = date.today()
+    year, month, day, day_of_month, month_name = match.groups()
+    try:
+        if year:
+            departure = date(int(year), int(month), int(day))
+            return departure if departure >= today else None
+        
+        month_num = _MONTH_MAP.get(month_name)
+        if month_num is None:
+            return None
+        departure = date(today.year, month_num, int(day_of_month))
+        return departure if departure >= today else departure.replace(year=today.year + 1)
+    except ValueError:
+        return None
+
+
+def parse_ymd_date(date_str: str) -> date:
+    """Parse a YYYY-MM-DD date; date.fromisoformat is the fast path, strptime still accepts unpadded fields"""
+    try:
+        return date.fromisoformat(date_str)
+    except ValueError:
+        return datetime.strptime(date_str, "%Y-%m-%d").date()
+
+
 def generate_date_range(start_date: str, end_date: str, max_searches: int = 15) -> List[str]:
     """Generate a list of dates to search within the given range"""
     
-    start = datetime.strptime(start_date, "%Y-%m-%d")
-    end = datetime.strptime(end_date, "%Y-%m-%d")
+    start = parse_ymd_date(start_date)
+    end = parse_ymd_date(end_date)
     
     total_days = (end - start).days + 1
     
+    # Search every day if range is small enough
     if total_days <= max_searches:
-        # Search every day if range is small enough
-        dates = []
-        current = start
-        while current <= end:
-            dates.append(current.strftime("%Y-%m-%d"))
-            current += timedelta(days=1)
-        return dates
-    else:
-        # Sample dates across the range if it's too large
-        step = total_days // max_searches
-        dates = []
-        for i in range(0, total_days, step):
-            current = start + timedelta(days=i)
-            if current <= end:
-                dates.append(current.strftime("%Y-%m-%d"))
-        
-        # Always include the last date
-        if dates[-1] != end_date:
-            dates.append(end_date)
+        return [(start + timedelta(days=i)).isoformat() for i in range(total_days)]
+    if max_searches < 2:
+        return [start.isoformat()][:max_searches]
+    
+    # Otherwise pick max_searches evenly spaced days, always including both endpoints
+    last_day = total_days - 1
+    last_index = max_searches - 1
+    return [(start + timedelta(days=i * last_day // last_index)).isoformat() for i in range(max_searches)]
+
+
+def wait_for_rate_limit() -> None:
+    """Block until another Travelport call fits in the sliding rate-limit window (thread-safe)"""
+    
+    while True:
+        with _rate_limit_lock:
+            now = time.monotonic()
+            while _rate_limit_calls and now - _rate_limit_calls[0] >= RATE_LIMIT_PERIOD:
+                _rate_limit_calls.popleft()
+            
+            if len(_rate_limit_calls) < RATE_LIMIT_CALLS:
+                _rate_limit_calls.append(now)
+                return
+            
+            wait_time = RATE_LIMIT_PERIOD - (now - _rate_limit_calls[0])
         
-        return dates[:max_searches]
+        time.sleep(wait_time)
+
+
+def search_catalog_cached(from_city: str, to_city: str, departure_date: str,
+                          return_date: Optional[str], passengers: int, passenger_age: int,
+                          headers: Optional[Dict[str, str]] = None) -> Dict:
+    """Run one catalog search, reusing a cached response for identical searches within the TTL.
+    An identical search already in flight is awaited rather than sent again.
+    Raises on API errors (failures are never cached).
+    
+    The returned dict is shared: every cache hit and in-flight waiter gets the same object, and it
+    ends up in other conversations' state (raw_api_response, bulk_search_results, reference_index).
+    Treat it as read-only; copy before changing anything in it.
+    """
+    
+    if SEARCH_CACHE_DISABLED:
+        return fetch_catalog_search(from_city, to_city, departure_date, return_date, passengers, passenger_age, headers)
+    
+    cache_key = (from_city, to_city, departure_date, return_date, passengers, passenger_age)
+    cached = _search_cache.get(cache_key)
+    if cached is not None:
+        logger.info("⚡ Search cache hit for %s→%s on %s", from_city, to_city, departure_date)
+        return cached
+    
+    with _search_inflight_lock:
+        pending = _search_inflight.get(cache_key)
+        if pending is None:
+            _search_inflight[cache_key] = in_flight = Future()
+    
+    if pending is not None:
+        logger.info("⚡ Joining in-flight search for %s→%s on %s", from_city, to_city, departure_date)
+        return pending.result()
+    
+    try:
+        result = fetch_catalog_search(from_city, to_city, departure_date, return_date, passengers, passenger_age, headers)
+        _search_cache.set(cache_key, result)
+        in_flight.set_result(result)
+        return result
+    except BaseException as e:
+        in_flight.set_exception(e)
+        raise
+    finally:
+        with _search_inflight_lock:
+            del _search_inflight[cache_key]
+
+
+def fetch_catalog_search(from_city: str, to_city: str, departure_date: str,
+                         return_date: Optional[str], passengers: int, passenger_age: int,
+                         headers: Optional[Dict[str, str]] = None) -> Dict:
+    """Call the Travelport catalog search API once (rate limited, uncached)"""
+    
+    # Build API payload
+    payload = build_flight_search_payload(
+        from_city=from_city,
+        to_city=to_city,
+        departure_date=departure_date,
+        return_date=return_date,
+        passengers=passengers,
+        passenger_age=passenger_age
+    )
+    
+    # Make API call
+    if headers is None:
+        headers = get_api_headers()
+    wait_for_rate_limit()
+    return trim_catalog_response(post_catalog_search(payload, headers))
+
+
+# ReferenceList types the agent resolves; the rest (brands, products, ...) is dropped before caching
+_RETAINED_REFERENCE_LISTS = frozenset({"ReferenceListFlight", "ReferenceListTermsAndConditions"})
+
+
+def trim_catalog_response(api_response: Dict) -> Dict:
+    """Keep only what the agent reads from a catalog response (offerings, flight/terms references and
+    transactionId), so cached and per-date results do not hold on to unused reference data.
+    Responses without a CatalogProductOfferingsResponse body are returned unchanged.
+    """
+    body = api_response.get("CatalogProductOfferingsResponse")
+    if not isinstance(body, dict):
+        return api_response
+    
+    trimmed = {key: body[key] for key in ("transactionId", "CatalogProductOfferings") if key in body}
+    trimmed["ReferenceList"] = [
+        ref_list for ref_list in body.get("ReferenceList", _NO_ITEMS)
+        if ref_list.get("@type") in _RETAINED_REFERENCE_LISTS
+    ]
+    return {"CatalogProductOfferingsResponse": trimmed}
 
 
 def search_single_date(from_city: str, to_city: str, departure_date: str, 
-                      return_date: Optional[str], passengers: int, passenger_age: int) -> Tuple[str, Optional[Dict]]:
-    """Search flights for a single date"""
+                      return_date: Optional[str], passengers: int, passenger_age: int,
+                      headers: Optional[Dict[str, str]] = None) -> Tuple[str, Optional[Dict]]:
+    """Search flights for a single date (pass shared headers to skip a per-call OAuth round-trip)"""
     
     try:
-        # Build API payload
-        payload = build_flight_search_payload(
-            from_city=from_city,
-            to_city=to_city,
-            departure_date=departure_date,
-            return_date=return_date,
-            passengers=passengers,
-            passenger_age=passenger_age
+        return departure_date, search_catalog_cached(
+            from_city, to_city, departure_date, return_date, passengers, passenger_age, headers
         )
         
-        # Make API call
-        headers = get_api_headers()
-        response = requests.post(CATALOG_URL, headers=headers, json=payload)
-        response.raise_for_status()
-        
-        return departure_date, response.json()
-        
     except Exception as e:
-        print(f"❌ Error searching date {departure_date}: {e}")
+        logger.error("❌ Error searching date %s: %s", departure_date, e)
         return departure_date, None
 
 
-def search_flights_bulk(state: FlightBookingState) -> FlightBookingState:
-    """Search flights across a date range and find the globally cheapest option"""
+def search_dates_concurrently(dates: List[str], from_city: str, to_city: str, return_date: Optional[str],
+                              passengers: int, passenger_age: int, headers: Dict[str, str],
+                              cheapest_by_date: Optional[Dict[str, PricedBrand]] = None) -> Dict[str, Dict]:
+    """Search several departure dates in parallel and return {date: api_response} in date-list order.
+    Runs on the shared search pool (at most BULK_SEARCH_MAX_WORKERS requests in flight process-wide).
+    Dates that fail or return nothing are left out; search_single_date enforces the rate limit.
+    If cheapest_by_date is given, each response is reduced to its cheapest offering as it is
+    collected, overlapping that scan with the requests still in flight.
+    """
+    
+    search_results = {}
+    search_date_worker = partial(
+        search_single_date, from_city, to_city,
+        return_date=return_date, passengers=passengers, passenger_age=passenger_age, headers=headers
+    )
+    
+    # search_single_date never raises (failures come back as None), so map's in-order results are safe to consume
+    for search_date, result in _search_executor.map(search_date_worker, dates):
+        if result:
+            search_results[search_date] = result
+            if cheapest_by_date is not None:
+                cheapest_by_date[search_date] = cheapest_offering_for_date(result)
+        logger.debug("🔍 Searched %s", search_date)
+    
+    return search_results
+
+
+def search_flights_bulk(state: FlightBookingState, searched_dates: FrozenSet[str] = frozenset(),
+                        prior_results: Optional[Dict[str, Dict]] = None,
+                        prior_cheapest_by_date: Optional[Dict[str, PricedBrand]] = None) -> FlightBookingState:
+    """Search flights across a date range and find the globally cheapest option.
+    Dates in searched_dates were already searched by the caller (the adaptive search's first batch):
+    they are not requested again, and their results come from prior_results / prior_cheapest_by_date.
+    """
     
     try:
         # Generate dates to search
         dates_to_search = generate_date_range(
             state["date_range_start"], 
             state["date_range_end"],
-            max_searches=15  # Limit to avoid API overload
+            max_searches=BULK_SEARCH_MAX_DATES  # Limit to avoid API overload
         )
+        new_dates = [search_date for search_date in dates_to_search if search_date not in searched_dates]
+        
+        logger.info("🗓️ Searching %s dates", len(new_dates))
+        logger.debug("🗓️ Dates to search: %s", new_dates)
+        
+        # Authenticate once and share the headers across the whole fan-out
+        cheapest_by_date: Dict[str, PricedBrand] = {}
+        new_results = search_dates_concurrently(
+            new_dates,
+            str(state["from_city"]),
+            str(state["to_city"]),
+            state.get("return_date"),
+            state.get("passengers", 1),
+            state.get("passenger_age", 25),
+            get_api_headers(),
+            cheapest_by_date
+        )
+        
+        search_results = new_results
+        if searched_dates:
+            prior_results = prior_results or {}
+            prior_cheapest_by_date = prior_cheapest_by_date or {}
+            search_results = {}
+            for search_date in dates_to_search:
+                if search_date in new_results:
+                    search_results[search_date] = new_results[search_date]
+                elif search_date in prior_results:
+                    search_results[search_date] = prior_results[search_date]
+                    cheapest_by_date[search_date] = prior_cheapest_by_date[search_date]
+        
+        if not search_results:
+            state["response_text"] = f"😔 No flights found in the date range {state['date_range_start']} to {state['date_range_end']}."
+            return state
         
-        print(f"🗓️ Searching {len(dates_to_search)} dates: {dates_to_search}")
+        # Store all results for analysis
+        state["bulk_search_results"] = search_results
+        state["bulk_cheapest_by_date"] = cheapest_by_date
+        state["search_dates"] = dates_to_search
+        
+        logger.info("✅ Bulk search completed. Found results for %s dates", len(search_results))
+        
+    except Exception as e:
+        logger.error("❌ Bulk search error: %s", e)
+        state["response_text"] = f"😔 Error during bulk search: {str(e)}"
+    
+    return state
+
+
+def is_unimodal(prices: List[float]) -> bool:
+    """True if prices fall (or stay flat) and then rise (or stay flat), i.e. have a single valley"""
+    i = 1
+    while i < len(prices) and prices[i] <= prices[i - 1]:
+        i += 1
+    while i < len(prices) and prices[i] >= prices[i - 1]:
+        i += 1
+    return i == len(prices)
+
+
+def search_flights_bulk_adaptive(state: FlightBookingState) -> FlightBookingState:
+    """Search a long date range in ADAPTIVE_SEARCH_ROUNDS batches of concurrent probes.
+    The first batch probes BULK_SEARCH_MAX_WORKERS evenly spaced days; if their prices form a single
+    valley, each later batch probes up to BULK_SEARCH_MAX_WORKERS more days inside the bracket around
+    the cheapest day so far. Two batches cost at most 16 calls in the same two rounds of requests as
+    uniform sampling (15 calls), but land much closer to the cheapest day (exactly on it for ranges of
+    about a month). Short ranges and multi-valley price curves use search_flights_bulk; the first
+    batch's days are part of its uniform sample, so the fallback reuses them and only requests
+    the other days (one more round, 15 calls in total, with or without the search cache).
+    """
+    
+    try:
+        start = parse_ymd_date(state["date_range_start"])
+        end = parse_ymd_date(state["date_range_end"])
+        total_days = (end - start).days + 1
+        
+        if total_days <= BULK_SEARCH_MAX_DATES:
+            return search_flights_bulk(state)
         
-        # Prepare search parameters
         from_city = str(state["from_city"])
         to_city = str(state["to_city"])
         return_date = state.get("return_date")
         passengers = state.get("passengers", 1)
         passenger_age = state.get("passenger_age", 25)
+        headers = get_api_headers()
         
-        # Use ThreadPoolExecutor for concurrent searches (be careful with rate limits)
-        search_results = {}
+        search_results: Dict[str, Dict] = {}
+        cheapest_by_date: Dict[str, PricedBrand] = {}
+        cheapest_by_day: Dict[int, float] = {}
         
-        # Sequential search to avoid overwhelming the API
-        for date in dates_to_search:
-            print(f"🔍 Searching {date}...")
-            try:
-                search_date, result = search_single_date(
-                    from_city, to_city, date, return_date, passengers, passenger_age
-                )
-                if result:
-                    search_results[search_date] = result
-                
-                # Add small delay to respect rate limits
-                time.sleep(0.5)
-                
-            except Exception as e:
-                print(f"⚠️ Failed to search {date}: {e}")
-                continue
+        def probe(days: List[int]) -> None:
+            """Search the given day offsets concurrently (one round of requests)"""
+            dates = [(start + timedelta(days=day)).isoformat() for day in days]
+            results = search_dates_concurrently(
+                dates, from_city, to_city, return_date, passengers, passenger_age, headers, cheapest_by_date
+            )
+            search_results.update(results)
+            for day, date in zip(days, dates):
+                cheapest_by_day[day] = cheapest_by_date[date][0] if date in cheapest_by_date else float('inf')
+        
+        # Same spacing as generate_date_range, so these days are every other day of the uniform sample
+        last_day = total_days - 1
+        last_index = BULK_SEARCH_MAX_WORKERS - 1
+        probe([i * last_day // last_index for i in range(BULK_SEARCH_MAX_WORKERS)])
+        
+        shape = [cheapest_by_day[day] for day in sorted(cheapest_by_day)]
+        if float('inf') in shape or not is_unimodal(shape):
+            logger.info("🗓️ Price curve is not unimodal, using uniform date sampling")
+            searched_dates = frozenset((start + timedelta(days=day)).isoformat() for day in cheapest_by_day)
+            return search_flights_bulk(state, searched_dates, search_results, cheapest_by_date)
+        
+        for _ in range(ADAPTIVE_SEARCH_ROUNDS - 1):
+            # With a single valley the cheapest day lies between the best probe's neighbours
+            probed = sorted(cheapest_by_day)
+            best = min(range(len(probed)), key=lambda i: cheapest_by_day[probed[i]])
+            lo, hi = probed[max(best - 1, 0)], probed[min(best + 1, len(probed) - 1)]
+            
+            candidates = [day for day in range(lo + 1, hi) if day not in cheapest_by_day]
+            if not candidates:
+                break
+            if len(candidates) > BULK_SEARCH_MAX_WORKERS:
+                count = len(candidates)
+                candidates = [candidates[(2 * i + 1) * count // (2 * BULK_SEARCH_MAX_WORKERS)]
+                              for i in range(BULK_SEARCH_MAX_WORKERS)]
+            probe(candidates)
         
         if not search_results:
             state["response_text"] = f"😔 No flights found in the date range {state['date_range_start']} to {state['date_range_end']}."
             return state
         
-        # Store all results for analysis
-        state["bulk_search_results"] = search_results
-        state["search_dates"] = dates_to_search
+        searched_dates = sorted(search_results)
+        state["bulk_search_results"] = {date: search_results[date] for date in searched_dates}
+        state["bulk_cheapest_by_date"] = cheapest_by_date
+        state["search_dates"] = [(start + timedelta(days=day)).isoformat() for day in sorted(cheapest_by_day)]
         
-        print(f"✅ Bulk search completed. Found results for {len(search_results)} dates")
+        logger.info("✅ Adaptive search completed. Probed %s of %s dates", len(cheapest_by_day), total_days)
         
     except Exception as e:
-        print(f"❌ Bulk search error: {e}")
+        logger.error("❌ Adaptive bulk search error: %s", e)
         state["response_text"] = f"😔 Error during bulk search: {str(e)}"
     
     return state
@@ -318,28 +819,20 @@ def search_flights_original(state: FlightBookingState) -> FlightBookingState:
     """Original single-date search function"""
     
     try:
-        # Build API payload
-        payload = build_flight_search_payload(
-            from_city=str(state["from_city"]),
-            to_city=str(state["to_city"]),
-            departure_date=str(state["departure_date"]),
-            return_date=state.get("return_date"),
-            passengers=state.get("passengers", 1),
-            passenger_age=state.get("passenger_age", 25)
+        api_result = search_catalog_cached(
+            str(state["from_city"]),
+            str(state["to_city"]),
+            str(state["departure_date"]),
+            state.get("return_date"),
+            state.get("passengers", 1),
+            state.get("passenger_age", 25)
         )
-        
-        # Make API call
-        headers = get_api_headers()
-        response = requests.post(CATALOG_URL, headers=headers, json=payload)
-        response.raise_for_status()
-        
-        api_result = response.json()
         state["raw_api_response"] = api_result
         
-        print(f"✅ Single date search completed")
+        logger.info("✅ Single date search completed")
         
     except Exception as e:
-        print(f"❌ Single date search error: {e}")
+        logger.error("❌ Single date search error: %s", e)
         state["response_text"] = f"😔 Sorry, I couldn't search for flights. Error: {str(e)}"
     
     return state
@@ -361,7 +854,7 @@ def search_flights(state: FlightBookingState) -> FlightBookingState:
             state["response_text"] = "I need a departure date for your flight search."
             return state
         
-        print(f"🔍 Searching {trip_type} flight: {state['departure_date']}")
+        logger.info("🔍 Searching %s flight: %s", trip_type, state['departure_date'])
         
         # Determine which payload to use based on trip type
         if state.get("return_date"):
@@ -374,14 +867,92 @@ def search_flights(state: FlightBookingState) -> FlightBookingState:
             state["response_text"] = "I need a valid date range for your search."
             return state
         
-        print(f"🔍 Searching date range: {state['date_range_start']} to {state['date_range_end']}")
-        return search_flights_bulk(state)
+        logger.info("🔍 Searching date range: %s to %s", state['date_range_start'], state['date_range_end'])
+        return search_flights_bulk_adaptive(state)
     
     else:
         state["response_text"] = "Invalid search type specified."
         return state
 
 
+def get_catalog_offerings(api_response: Dict) -> List[Dict]:
+    """Return the CatalogProductOffering list from a Travelport catalog response"""
+    return (
+        api_response.get("CatalogProductOfferingsResponse", {})
+        .get("CatalogProductOfferings", {})
+        .get("CatalogProductOffering", [])
+    )
+
+
+# Shared immutable default for .get() on list fields, avoids allocating a new [] per lookup
+_NO_ITEMS: Tuple = ()
+_EMPTY: Dict = {}  # Shared read-only default for missing nested objects; never mutate
+
+
+def get_reference_lists(api_response: Dict) -> Dict[str, Dict]:
+    """Map each ReferenceList entry of a Travelport catalog response by its @type"""
+    return {
+        ref_list.get("@type"): ref_list
+        for ref_list in api_response.get("CatalogProductOfferingsResponse", {}).get("ReferenceList", [])
+    }
+
+
+def index_by_id(items: List[Dict]) -> Dict[str, Dict]:
+    """Map reference items (flights, terms) by id; the first item wins if an id repeats"""
+    index: Dict[str, Dict] = {}
+    for item in items:
+        index.setdefault(item.get("id"), item)
+    return index
+
+
+def get_reference_index(state: FlightBookingState) -> Tuple[Dict[str, Dict], Dict[str, Dict], Dict[str, str]]:
+    """Return (flight_by_id, terms_by_id, baggage_by_ref) for state['raw_api_response'].
+    Built once per response and kept on the state, so scanning many offerings of the same
+    response (e.g. the combined round-trip search) does not re-index the ReferenceList each time.
+    baggage_by_ref starts empty and memoizes extract_baggage_allowance for this response.
+    """
+    api_response = state.get("raw_api_response") or _EMPTY
+    cached = state.get("reference_index")
+    if cached is not None and cached[0] is api_response:
+        return cached[1], cached[2], cached[3]
+    
+    reference_lists = get_reference_lists(api_response)
+    flight_by_id = index_by_id(reference_lists.get("ReferenceListFlight", {}).get("Flight", []))
+    terms_by_id = index_by_id(reference_lists.get("ReferenceListTermsAndConditions", {}).get("TermsAndConditions", []))
+    baggage_by_ref: Dict[str, str] = {}
+    state["reference_index"] = (api_response, flight_by_id, terms_by_id, baggage_by_ref)
+    return flight_by_id, terms_by_id, baggage_by_ref
+
+
+def iter_offering_prices(offerings: List[Dict]) -> Iterator[PricedBrand]:
+    """Yield (price, offering, option, brand_offering) for every priced ProductBrandOffering, skipping missing/invalid prices"""
+    for offering in offerings:
+        for option in offering.get("ProductBrandOptions", _NO_ITEMS):
+            for brand_offering in option.get("ProductBrandOffering", _NO_ITEMS):
+                try:
+                    price = brand_offering["BestCombinablePrice"]["TotalPrice"]
+                    if not price:
+                        continue
+                    price = float(price)
+                except (KeyError, TypeError, ValueError):
+                    continue
+                yield price, offering, option, brand_offering
+
+
+def cheapest_offering_for_date(api_response: Optional[Dict]) -> PricedBrand:
+    """Return the cheapest priced brand in one date's response, or (inf, None, None, None)"""
+    if not api_response:
+        return _UNPRICED
+    return min(iter_offering_prices(get_catalog_offerings(api_response)), key=itemgetter(0), default=_UNPRICED)
+
+
+def cheapest_offering(offerings: List[Dict]) -> Optional[Dict]:
+    """Return the offering holding the lowest brand price in one pass (the first offering if none is priced)"""
+    if not offerings:
+        return None
+    return min(iter_offering_prices(offerings), key=itemgetter(0), default=(None, offerings[0]))[1]
+
+
 def analyze_bulk_search_results(state: FlightBookingState) -> FlightBookingState:
     """Analyze bulk search results to find the globally cheapest flight"""
     
@@ -392,43 +963,25 @@ def analyze_bulk_search_results(state: FlightBookingState) -> FlightBookingState
         return state
     
     try:
-        global_cheapest_flight = None
-        global_lowest_price = float('inf')
-        best_date = None
-        
-        # Analyze each date's results
+        # Reduce each date to its own minimum (usually already done while the search was in flight),
+        # then pick the global one with a C-level min + index
+        cheapest_by_date = state.get("bulk_cheapest_by_date") or {}
+        prices: List[float] = []
+        candidates: List[Tuple[PricedBrand, str]] = []
         for search_date, api_response in bulk_results.items():
-            print(f"🔍 Analyzing results for {search_date}")
-            
-            response_data = api_response.get("CatalogProductOfferingsResponse", {})
-            catalog_offerings = response_data.get("CatalogProductOfferings", {})
-            offerings = catalog_offerings.get("CatalogProductOffering", [])
-            
-            if not offerings:
-                continue
-            
-            # Find cheapest flight for this date
-            for offering in offerings:
-                try:
-                    product_brand_options = offering.get("ProductBrandOptions", [])
-                    if not product_brand_options:
-                        continue
-                    
-                    for option in product_brand_options:
-                        product_brand_offerings = option.get("ProductBrandOffering", [])
-                        
-                        for brand_offering in product_brand_offerings:
-                            best_price = brand_offering.get("BestCombinablePrice", {})
-                            if isinstance(best_price, dict):
-                                price = best_price.get("TotalPrice", 0)
-                                if price and float(price) < global_lowest_price:
-                                    global_lowest_price = float(price)
-                                    global_cheapest_flight = offering
-                                    best_date = search_date
-                
-                except Exception as e:
-                    print(f"⚠️ Error analyzing offering for {search_date}: {e}")
-                    continue
+            cheapest = cheapest_by_date.get(search_date)
+            if cheapest is None:
+                cheapest = cheapest_offering_for_date(api_response)
+            if cheapest[1] is not None:
+                prices.append(cheapest[0])
+                candidates.append((cheapest, search_date))
+        
+        global_lowest_price, global_cheapest_flight, best_date = float('inf'), None, None
+        if prices:
+            global_lowest_price = min(prices)
+            # index() returns the first minimum, so the earliest date wins ties
+            best_priced, best_date = candidates[prices.index(global_lowest_price)]
+            global_cheapest_flight = best_priced[1]
         
         if global_cheapest_flight and best_date:
             # Store the best results
@@ -437,7 +990,9 @@ def analyze_bulk_search_results(state: FlightBookingState) -> FlightBookingState
             state["raw_api_response"] = bulk_results[best_date]  # Set this for compatibility
             
             # Extract flight details
-            flight_details = extract_flight_details(global_cheapest_flight, state, best_date)
+            flight_details = extract_flight_details(
+                global_cheapest_flight, state, best_date, priced_brand=(best_priced[2], best_priced[3])
+            )
             
             range_desc = state.get("range_description", f"{state.get('date_range_start')} to {state.get('date_range_end')}")
             
@@ -456,27 +1011,17 @@ def analyze_bulk_search_results(state: FlightBookingState) -> FlightBookingState
  ❓ Would you like me to search for more options or help you with booking?"""
             
             # Generate and persist booking quote reference (separate message is sent by sender layer)
-            try:
-                quote_code = generate_quote_reference_for_offering(state, global_cheapest_flight)
-                state["quote_reference"] = quote_code
-                try:
-                    from ..services.memory_service import memory_manager
-                    memory_manager.add_flight_context(state.get("user_id", "unknown"), {
-                        "last_quote_reference": quote_code
-                    })
-                except Exception as _:
-                    pass
-            except Exception as _:
-                pass
+            quote_code = generate_quote_reference_for_offering(state, global_cheapest_flight)
+            remember_quote_reference(state, quote_code)
              
             state["response_text"] = response
              
-            print(f"✅ Found global cheapest flight: ${global_lowest_price} on {best_date}")
+            logger.info("✅ Found global cheapest flight: $%s on %s", global_lowest_price, best_date)
         else:
             state["response_text"] = "✈️ I found flights but couldn't determine the best pricing across the date range."
     
     except Exception as e:
-        print(f"❌ Error analyzing bulk results: {e}")
+        logger.error("❌ Error analyzing bulk results: %s", e)
         state["response_text"] = "😔 Error analyzing search results across the date range."
     
     return state
@@ -533,10 +1078,7 @@ def find_cheapest_flight(state: FlightBookingState) -> FlightBookingState:
         return state
 
     try:
-        api_response = state["raw_api_response"]
-        response_data = api_response.get("CatalogProductOfferingsResponse", {})
-        catalog_offerings = response_data.get("CatalogProductOfferings", {})
-        offerings = catalog_offerings.get("CatalogProductOffering", [])
+        offerings = get_catalog_offerings(state["raw_api_response"])
 
         if not offerings:
             state["response_text"] = "No flights found for your search criteria."
@@ -547,17 +1089,6 @@ def find_cheapest_flight(state: FlightBookingState) -> FlightBookingState:
         trip_type = "round-trip" if state.get("return_date") else state.get("trip_type", "one-way")
         has_return_date = bool(state.get("return_date"))
 
-        def offering_min_price(offering: Dict) -> Optional[float]:
-            min_price = None
-            for option in offering.get("ProductBrandOptions", []):
-                for pbo in option.get("ProductBrandOffering", []):
-                    best_price = pbo.get("BestCombinablePrice", {})
-                    if isinstance(best_price, dict) and best_price.get("TotalPrice") is not None:
-                        price = float(best_price["TotalPrice"])
-                        if min_price is None or price < min_price:
-                            min_price = price
-            return min_price
-
         # Partition offerings by direction
         outbound_candidates: List[Dict] = []
         return_candidates: List[Dict] = []
@@ -569,67 +1100,52 @@ def find_cheapest_flight(state: FlightBookingState) -> FlightBookingState:
             elif codes_match(dep, to_city) and codes_match(arr, from_city):
                 return_candidates.append(off)
 
-        print(f"🔍 Directional offerings: outbound={len(outbound_candidates)}, return={len(return_candidates)}")
+        logger.debug("🔍 Directional offerings: outbound=%s, return=%s", len(outbound_candidates), len(return_candidates))
 
         # Round-trip pairing when requested/available
         if (trip_type == "round-trip" or has_return_date) and outbound_candidates and return_candidates:
             # Pick cheapest outbound and cheapest return
-            outbound = min(outbound_candidates, key=lambda o: offering_min_price(o) or float("inf"))
-            return_off = min(return_candidates, key=lambda o: offering_min_price(o) or float("inf"))
-            print("✅ Using paired outbound/return offerings for true round-trip")
+            outbound = cheapest_offering(outbound_candidates)
+            return_off = cheapest_offering(return_candidates)
+            logger.info("✅ Using paired outbound/return offerings for true round-trip")
             return process_true_roundtrip(state, outbound, return_off)
 
         # Fallback attempt: some APIs provide a single offering that includes both outbound and return
         if trip_type == "round-trip" or has_return_date:
-            print("🔎 Trying to detect a combined round-trip within a single offering")
+            logger.debug("🔎 Trying to detect a combined round-trip within a single offering")
             best_rt_details = None
             best_rt_offering = None
             best_rt_price = float("inf")
             for off in offerings:
-                try:
-                    details = extract_roundtrip_flight_details(off, state)
-                    # Consider it valid round-trip only if both legs are present
-                    if (
-                        details.get("outbound_departure_time") != "N/A"
-                        and details.get("return_departure_time") != "N/A"
-                    ):
-                        price_str = details.get("price") or "0"
-                        price_val = float(price_str) if str(price_str).replace(".", "", 1).isdigit() else float("inf")
-                        if price_val < best_rt_price:
-                            best_rt_price = price_val
-                            best_rt_details = details
-                            best_rt_offering = off
-                except Exception:
-                    continue
+                # extract_roundtrip_flight_details handles malformed offerings itself and returns N/A fields
+                details = extract_roundtrip_flight_details(off, state)
+                # Consider it valid round-trip only if both legs are present
+                if (
+                    details.get("outbound_departure_time") != "N/A"
+                    and details.get("return_departure_time") != "N/A"
+                ):
+                    price_str = details.get("price") or "0"
+                    price_val = float(price_str) if str(price_str).replace(".", "", 1).isdigit() else float("inf")
+                    if price_val < best_rt_price:
+                        best_rt_price = price_val
+                        best_rt_details = details
+                        best_rt_offering = off
             if best_rt_details and best_rt_offering:
-                print("✅ Using combined round-trip extracted from a single offering")
+                logger.info("✅ Using combined round-trip extracted from a single offering")
                 state["cheapest_flight"] = best_rt_offering
                 response = format_flight_response(best_rt_details)
                 # Persist quote reference for later separate message
-                try:
-                    quote_code = generate_quote_reference_for_offering(state, best_rt_offering)
-                    state["quote_reference"] = quote_code
-                    try:
-                        from ..services.memory_service import memory_manager
-                        memory_manager.add_flight_context(state.get("user_id", "unknown"), {
-                            "last_quote_reference": quote_code
-                        })
-                    except Exception as _:
-                        pass
-                except Exception as _:
-                    pass
+                quote_code = generate_quote_reference_for_offering(state, best_rt_offering)
+                remember_quote_reference(state, quote_code)
                 state["response_text"] = response
                 return state
 
         # Else: fall back to one-way → choose overall cheapest offering and process
-        print("➡️ Falling back to one-way analysis (no valid paired round-trip found)")
-        cheapest_offering = min(offerings, key=lambda o: offering_min_price(o) or float("inf"))
-        return process_oneway_journey(state, [cheapest_offering])
+        logger.info("➡️ Falling back to one-way analysis (no valid paired round-trip found)")
+        return process_oneway_journey(state, [cheapest_offering(offerings)])
 
     except Exception as e:
-        print(f"❌ Error in enhanced flight analysis: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Error in enhanced flight analysis: %s", e)
         state["response_text"] = "😔 Error analyzing flight results."
         return state
 
@@ -638,7 +1154,7 @@ def process_true_roundtrip(state: FlightBookingState, outbound_offering: Dict, r
     """Process a true round-trip with complete outbound and return journeys"""
     
     try:
-        print(f"🔄 Processing true round-trip with separate complete journeys")
+        logger.debug("🔄 Processing true round-trip with separate complete journeys")
         
         # Extract details for each complete journey
         outbound_details = extract_complete_journey_details(outbound_offering, state, "outbound")
@@ -686,28 +1202,17 @@ def process_true_roundtrip(state: FlightBookingState, outbound_offering: Dict, r
         response = format_flight_response(roundtrip_details)
         
         # Generate and append booking quote reference
-        try:
-            quote_code = generate_quote_reference_for_roundtrip(state, outbound_offering, return_offering)
-            state["quote_reference"] = quote_code
-            # Persist to memory for later booking
-            try:
-                from ..services.memory_service import memory_manager
-                memory_manager.add_flight_context(state.get("user_id", "unknown"), {
-                    "last_quote_reference": quote_code
-                })
-            except Exception as _:
-                pass
-        except Exception as _:
-            pass
+        quote_code = generate_quote_reference_for_roundtrip(state, outbound_offering, return_offering)
+        remember_quote_reference(state, quote_code)
         
         state["response_text"] = response
         
-        print(f"✅ True round-trip processed: EUR {total_price:.2f} total")
+        logger.info("✅ True round-trip processed: EUR %.2f total", total_price)
         
         return state
         
     except Exception as e:
-        print(f"❌ Error processing true round-trip: {e}")
+        logger.error("❌ Error processing true round-trip: %s", e)
         return process_oneway_journey(state, [outbound_offering])
 
 
@@ -716,34 +1221,19 @@ def extract_complete_journey_details(offering: Dict, state: FlightBookingState,
     
     try:
         # Find the cheapest option within this complete journey
-        cheapest_price = float('inf')
-        cheapest_option = None
-        best_flight_refs = []
-        best_terms_ref = None
-        
-        product_brand_options = offering.get("ProductBrandOptions", [])
-        
-        for option in product_brand_options:
-            flight_refs = option.get("flightRefs", [])
-            product_brand_offerings = option.get("ProductBrandOffering", [])
-            
-            for brand_offering in product_brand_offerings:
-                best_price = brand_offering.get("BestCombinablePrice", {})
-                if isinstance(best_price, dict):
-                    price = best_price.get("TotalPrice", 0)
-                    if price and float(price) < cheapest_price:
-                        cheapest_price = float(price)
-                        cheapest_option = brand_offering
-                        best_flight_refs = flight_refs
-                        
-                        terms_conditions = brand_offering.get("TermsAndConditions", {})
-                        if isinstance(terms_conditions, dict):
-                            best_terms_ref = terms_conditions.get("termsAndConditionsRef")
-        
+        _, _, best_option, cheapest_option = min(
+            iter_offering_prices((offering,)), key=itemgetter(0), default=_UNPRICED
+        )
         if not cheapest_option:
-            print(f"⚠️ No valid options found in {journey_type} journey")
+            logger.warning("⚠️ No valid options found in %s journey", journey_type)
             return None
         
+        best_flight_refs = best_option.get("flightRefs", [])
+        best_terms_ref = None
+        terms_conditions = cheapest_option.get("TermsAndConditions", {})
+        if isinstance(terms_conditions, dict):
+            best_terms_ref = terms_conditions.get("termsAndConditionsRef")
+        
         # Extract detailed flight information for the complete journey
         journey_details = extract_journey_details_from_refs(
             best_flight_refs, 
@@ -752,17 +1242,23 @@ def extract_complete_journey_details(offering: Dict, state: FlightBookingState,
             state
         )
         
-        print(f"✅ {journey_type.title()} journey: {journey_details['currency']} {journey_details['price']}")
-        print(f"   Route: {journey_details['departure_time']} → {journey_details['arrival_time']}")
-        print(f"   Stops: {journey_details['stops']}")
+        logger.debug("✅ %s journey: %s %s", journey_type.title(), journey_details['currency'], journey_details['price'])
+        logger.debug("   Route: %s → %s", journey_details['departure_time'], journey_details['arrival_time'])
+        logger.debug("   Stops: %s", journey_details['stops'])
         
         return journey_details
         
     except Exception as e:
-        print(f"❌ Error extracting {journey_type} journey details: {e}")
+        logger.error("❌ Error extracting %s journey details: %s", journey_type, e)
         return None
 
 
+def segment_departure_key(segment: Dict) -> Tuple[str, str]:
+    """Chronological sort key for a flight segment: (departure date, departure time)"""
+    departure = segment.get("Departure") or _EMPTY
+    return (departure.get("date", ""), departure.get("time", ""))
+
+
 def extract_journey_details_from_refs(flight_refs: List[str], terms_ref: Optional[str], price_option: Dict, state: FlightBookingState) -> Dict:
     """Extract details for a complete journey (possibly with multiple segments)"""
     
@@ -792,52 +1288,36 @@ def extract_journey_details_from_refs(flight_refs: List[str], terms_ref: Optiona
         
         # Extract flight details from references
         if flight_refs and state.get("raw_api_response"):
-            reference_list = state["raw_api_response"].get("CatalogProductOfferingsResponse", {}).get("ReferenceList", [])
-            
-            # Find flight reference list
-            flight_reference_list = None
-            terms_and_conditions_list = None
+            flight_by_id, terms_by_id, baggage_by_ref = get_reference_index(state)
             
-            for ref_list in reference_list:
-                if ref_list.get("@type") == "ReferenceListFlight":
-                    flight_reference_list = ref_list.get("Flight", [])
-                elif ref_list.get("@type") == "ReferenceListTermsAndConditions":
-                    terms_and_conditions_list = ref_list.get("TermsAndConditions", [])
-            
-            if flight_reference_list:
+            if flight_by_id:
                 # Get ALL flight segments for this complete journey
-                flight_segments = []
-                for flight_ref in flight_refs:
-                    for flight in flight_reference_list:
-                        if flight.get("id") == flight_ref:
-                            flight_segments.append(flight)
-                            break
+                flight_segments = [flight_by_id[ref] for ref in flight_refs if ref in flight_by_id]
                 
                 # Sort segments by departure time to get correct sequence
-                flight_segments.sort(key=lambda x: (
-                    x.get("Departure", {}).get("date", ""),
-                    x.get("Departure", {}).get("time", "")
-                ))
+                flight_segments.sort(key=segment_departure_key)
                 
-                print(f"🔍 Found {len(flight_segments)} segments for this journey")
-                for i, segment in enumerate(flight_segments):
-                    dep_loc = segment.get("Departure", {}).get("location", "")
-                    arr_loc = segment.get("Arrival", {}).get("location", "")
-                    dep_time = segment.get("Departure", {}).get("time", "")
-                    print(f"   Segment {i+1}: {dep_loc} → {arr_loc} at {dep_time}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("🔍 Found %s segments for this journey", len(flight_segments))
+                    for i, segment in enumerate(flight_segments):
+                        departure = segment.get("Departure") or _EMPTY
+                        logger.debug(
+                            "   Segment %s: %s → %s at %s", i + 1, departure.get("location", ""),
+                            (segment.get("Arrival") or _EMPTY).get("location", ""), departure.get("time", "")
+                        )
                 
                 # Extract details from the complete journey (all segments combined)
                 if flight_segments:
                     details.update(extract_complete_journey_info(flight_segments))
             
             # Extract baggage information
-            if terms_ref and terms_and_conditions_list:
-                baggage_info = extract_baggage_allowance(terms_ref, terms_and_conditions_list)
+            if terms_ref and terms_by_id:
+                baggage_info = extract_baggage_allowance(terms_ref, terms_by_id, baggage_by_ref)
                 if baggage_info:
                     details["baggage"] = baggage_info
     
     except Exception as e:
-        print(f"⚠️ Error extracting journey details from refs: {e}")
+        logger.warning("⚠️ Error extracting journey details from refs: %s", e)
     
     return details
 
@@ -856,7 +1336,7 @@ def extract_complete_journey_info(flight_segments: List[Dict]) -> Dict:
         last_segment = flight_segments[-1]
         
         # Overall journey departure (first segment departure)
-        departure_info = first_segment.get("Departure", {})
+        departure_info = first_segment.get("Departure") or _EMPTY
         details["departure_time"] = format_flight_datetime(
             departure_info.get("date", ""),
             departure_info.get("time", ""),
@@ -865,29 +1345,19 @@ def extract_complete_journey_info(flight_segments: List[Dict]) -> Dict:
         )
         
         # Overall journey arrival (last segment arrival)
-        arrival_info = last_segment.get("Arrival", {})
+        arrival_info = last_segment.get("Arrival") or _EMPTY
         details["arrival_time"] = format_flight_datetime(
             arrival_info.get("date", ""),
             arrival_info.get("time", ""),
             arrival_info.get("location", "")
         )
         
-        # Collect all airlines and flight numbers
-        airlines = set()
-        flight_numbers = []
-        
-        for segment in flight_segments:
-            carrier = segment.get("carrier", "")
-            if carrier:
-                airlines.add(get_airline_name(carrier))
-                
-            number = segment.get("number", "")
-            if number:
-                flight_numbers.append(f"{carrier}{number}")
+        # One pass over the segments for times, airlines and flight numbers
+        segment_times, airlines, flight_numbers = scan_segments(flight_segments)
         
         if airlines:
             if len(airlines) == 1:
-                details["airline"] = list(airlines)[0]
+                details["airline"] = next(iter(airlines))
             else:
                 details["airline"] = f"Multiple: {', '.join(airlines)}"
         
@@ -901,29 +1371,19 @@ def extract_complete_journey_info(flight_segments: List[Dict]) -> Dict:
             details["layover_details"] = []
         else:
             # Calculate layovers between segments
-            layover_info = calculate_layover_details(flight_segments)
+            layover_info = calculate_layover_details(flight_segments, segment_times)
             details["layover_details"] = layover_info.get("layover_details", [])
-            
-            stops_info = f"{num_segments - 1} stop(s)"
-            if details["layover_details"]:
-                layover_summary = []
-                for layover in details["layover_details"]:
-                    city = layover["city"]
-                    duration = layover["duration"]
-                    layover_summary.append(f"{city} ({duration})")
-                stops_info += f" via {', '.join(layover_summary)}"
-            
-            details["stops"] = stops_info
+            details["stops"] = format_stops_summary(num_segments, details["layover_details"])
         
         # Total journey duration (from first departure to last arrival)
-        total_duration = calculate_total_flight_duration(flight_segments)
+        total_duration = calculate_total_flight_duration(flight_segments, segment_times)
         if total_duration:
             details["duration"] = total_duration
         
-        print(f"📋 Journey summary: {details['stops']}, Duration: {details['duration']}")
+        logger.debug("📋 Journey summary: %s, Duration: %s", details['stops'], details['duration'])
     
     except Exception as e:
-        print(f"⚠️ Error extracting complete journey info: {e}")
+        logger.warning("⚠️ Error extracting complete journey info: %s", e)
     
     return details
 
@@ -932,59 +1392,35 @@ def process_oneway_journey(state: FlightBookingState, offerings: List[Dict]) ->
     """Process one-way journey (single complete journey, possibly with layovers)"""
     
     try:
-        print(f"➡️ Processing one-way journey from {len(offerings)} offerings")
+        logger.debug("➡️ Processing one-way journey from %s offerings", len(offerings))
         
         # Find the cheapest complete journey
-        cheapest_offering = None
-        lowest_price = float('inf')
+        lowest_price, best_offering, best_option, best_brand = min(
+            iter_offering_prices(offerings), key=itemgetter(0), default=_UNPRICED
+        )
         
-        for offering in offerings:
-            product_brand_options = offering.get("ProductBrandOptions", [])
+        if best_offering:
+            state["cheapest_flight"] = best_offering
             
-            for option in product_brand_options:
-                product_brand_offerings = option.get("ProductBrandOffering", [])
-                
-                for brand_offering in product_brand_offerings:
-                    best_price = brand_offering.get("BestCombinablePrice", {})
-                    if isinstance(best_price, dict):
-                        price = best_price.get("TotalPrice", 0)
-                        if price and float(price) < lowest_price:
-                            lowest_price = float(price)
-                            cheapest_offering = offering
-        
-        if cheapest_offering:
-            state["cheapest_flight"] = cheapest_offering
-            
-            # Extract journey details using the existing function
-            journey_details = extract_flight_details(cheapest_offering, state)
+            # Extract journey details for the brand the scan above already picked
+            journey_details = extract_flight_details(best_offering, state, priced_brand=(best_option, best_brand))
             response = format_flight_response(journey_details)
             
             # Generate and append booking quote reference
-            try:
-                quote_code = generate_quote_reference_for_offering(state, cheapest_offering)
-                state["quote_reference"] = quote_code
-                response = append_booking_instructions(response, quote_code)
-                # Persist to memory for later booking
-                try:
-                    from ..services.memory_service import memory_manager
-                    memory_manager.add_flight_context(state.get("user_id", "unknown"), {
-                        "last_quote_reference": quote_code
-                    })
-                except Exception as _:
-                    pass
-            except Exception as _:
-                pass
+            quote_code = generate_quote_reference_for_offering(state, best_offering)
+            remember_quote_reference(state, quote_code)
+            response = append_booking_instructions(response, quote_code)
             
             state["response_text"] = response
             
-            print(f"✅ Found cheapest one-way journey: {journey_details['currency']} {journey_details['price']}")
-            print(f"   Complete route: {journey_details['departure_time']} → {journey_details['arrival_time']}")
-            print(f"   Stops: {journey_details['stops']}")
+            logger.info("✅ Found cheapest one-way journey: %s %s", journey_details['currency'], journey_details['price'])
+            logger.debug("   Complete route: %s → %s", journey_details['departure_time'], journey_details['arrival_time'])
+            logger.debug("   Stops: %s", journey_details['stops'])
         else:
             state["response_text"] = "✈️ I found flights but couldn't determine pricing."
     
     except Exception as e:
-        print(f"❌ Error processing one-way journey: {e}")
+        logger.error("❌ Error processing one-way journey: %s", e)
         state["response_text"] = "😔 Error analyzing flight results."
     
     return state
@@ -1022,65 +1458,42 @@ def extract_roundtrip_flight_details(flight_offering: Dict, state: FlightBooking
     }
     
     try:
-        # Extract price information
-        cheapest_price = float('inf')
+        # Extract price information from the cheapest priced brand
         best_flight_refs = []
-        best_currency = "EUR"
         best_terms_and_conditions_ref = None
         
-        product_brand_options = flight_offering.get("ProductBrandOptions", [])
-        
-        for option in product_brand_options:
-            flight_refs = option.get("flightRefs", [])
+        _, _, best_option, best_brand_offering = min(
+            iter_offering_prices((flight_offering,)), key=itemgetter(0), default=_UNPRICED
+        )
+        if best_brand_offering is not None:
+            best_flight_refs = best_option.get("flightRefs", [])
+            best_price = best_brand_offering["BestCombinablePrice"]
+            details["price"] = str(best_price["TotalPrice"])
+            
+            currency_info = best_price.get("CurrencyCode", {})
+            details["currency"] = currency_info.get("value", "EUR") if isinstance(currency_info, dict) else "EUR"
             
-            product_brand_offerings = option.get("ProductBrandOffering", [])
-            for brand_offering in product_brand_offerings:
-                best_price = brand_offering.get("BestCombinablePrice", {})
-                if isinstance(best_price, dict) and best_price.get("TotalPrice"):
-                    price = float(best_price["TotalPrice"])
-                    if price < cheapest_price:
-                        cheapest_price = price
-                        best_flight_refs = flight_refs
-                        details["price"] = str(best_price["TotalPrice"])
-                        
-                        currency_info = best_price.get("CurrencyCode", {})
-                        if isinstance(currency_info, dict):
-                            best_currency = currency_info.get("value", "EUR")
-                        details["currency"] = best_currency
-                        
-                        terms_and_conditions = brand_offering.get("TermsAndConditions", {})
-                        if isinstance(terms_and_conditions, dict):
-                            best_terms_and_conditions_ref = terms_and_conditions.get("termsAndConditionsRef")
+            terms_and_conditions = best_brand_offering.get("TermsAndConditions", {})
+            if isinstance(terms_and_conditions, dict):
+                best_terms_and_conditions_ref = terms_and_conditions.get("termsAndConditionsRef")
         
         # Extract flight details from reference list
         if best_flight_refs and state.get("raw_api_response"):
-            reference_list = state["raw_api_response"].get("CatalogProductOfferingsResponse", {}).get("ReferenceList", [])
+            flight_by_id, terms_by_id, baggage_by_ref = get_reference_index(state)
             
-            flight_reference_list = None
-            terms_and_conditions_list = None
-            
-            for ref_list in reference_list:
-                if ref_list.get("@type") == "ReferenceListFlight":
-                    flight_reference_list = ref_list.get("Flight", [])
-                elif ref_list.get("@type") == "ReferenceListTermsAndConditions":
-                    terms_and_conditions_list = ref_list.get("TermsAndConditions", [])
-            
-            if flight_reference_list:
-                print(f"🔍 Processing {len(best_flight_refs)} flight references for round-trip")
+            if flight_by_id:
+                logger.debug("🔍 Processing %s flight references for round-trip", len(best_flight_refs))
                 
-                # Get all flight segments
-                all_flight_segments = []
+                # Get all flight segments, keyed by (date, time) as they are resolved
+                keyed_segments = []
                 for flight_ref in best_flight_refs:
-                    for flight in flight_reference_list:
-                        if flight.get("id") == flight_ref:
-                            all_flight_segments.append(flight)
-                            break
+                    flight = flight_by_id.get(flight_ref)
+                    if flight is not None:
+                        keyed_segments.append((*segment_departure_key(flight), flight))
                 
-                # Sort by departure time
-                all_flight_segments.sort(key=lambda x: (
-                    x.get("Departure", {}).get("date", ""),
-                    x.get("Departure", {}).get("time", "")
-                ))
+                # Sort by departure time on the precomputed keys (stable, so ties keep ref order)
+                keyed_segments.sort(key=itemgetter(0, 1))
+                all_flight_segments = [keyed[2] for keyed in keyed_segments]
                 
                 # Split into outbound and return segments
                 outbound_segments, return_segments = split_roundtrip_segments(
@@ -1089,7 +1502,7 @@ def extract_roundtrip_flight_details(flight_offering: Dict, state: FlightBooking
                     str(state["to_city"])
                 )
                 
-                print(f"✅ Split segments: {len(outbound_segments)} outbound, {len(return_segments)} return")
+                logger.debug("✅ Split segments: %s outbound, %s return", len(outbound_segments), len(return_segments))
                 
                 # Process outbound flight
                 if outbound_segments:
@@ -1108,23 +1521,21 @@ def extract_roundtrip_flight_details(flight_offering: Dict, state: FlightBooking
                         details["total_duration"] = total_duration
             
             # Extract baggage info
-            if best_terms_and_conditions_ref and terms_and_conditions_list:
-                baggage_info = extract_baggage_allowance(best_terms_and_conditions_ref, terms_and_conditions_list)
+            if best_terms_and_conditions_ref and terms_by_id:
+                baggage_info = extract_baggage_allowance(best_terms_and_conditions_ref, terms_by_id, baggage_by_ref)
                 if baggage_info:
                     details["baggage"] = baggage_info
                     
-        print(f"✅ Round-trip flight details extracted")
+        logger.debug("✅ Round-trip flight details extracted")
         
     except Exception as e:
-        print(f"❌ Error extracting round-trip flight details: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Error extracting round-trip flight details: %s", e)
     
     return details
 
 
 def split_roundtrip_segments(all_segments: List[Dict], origin: str, destination: str) -> Tuple[List[Dict], List[Dict]]:
-    """Split flight segments into outbound (origin→destination) and return (destination→origin).
+    """Split chronologically sorted flight segments into outbound (origin→destination) and return (destination→origin).
     - Outbound includes ALL segments up to and including the first segment whose arrival is the destination.
     - Return includes all remaining segments after that point.
     - Falls back gracefully if destination is never reached by using a midpoint split.
@@ -1137,18 +1548,14 @@ def split_roundtrip_segments(all_segments: List[Dict], origin: str, destination:
         if not all_segments:
             return outbound_segments, return_segments
         
-        # Ensure chronological order by departure timestamp
-        def dep_key(seg: Dict) -> Tuple[str, str]:
-            dep = seg.get("Departure", {})
-            return (dep.get("date", ""), dep.get("time", ""))
-        
-        segments = sorted(all_segments, key=dep_key)
+        # Callers sort by departure once while resolving refs; no second sort here
+        segments = all_segments
         
         reached_destination = False
         
         for seg in segments:
-            dep_loc = seg.get("Departure", {}).get("location", "")
-            arr_loc = seg.get("Arrival", {}).get("location", "")
+            dep_loc = (seg.get("Departure") or _EMPTY).get("location", "")
+            arr_loc = (seg.get("Arrival") or _EMPTY).get("location", "")
             
             if not reached_destination:
                 outbound_segments.append(seg)
@@ -1169,17 +1576,17 @@ def split_roundtrip_segments(all_segments: List[Dict], origin: str, destination:
             # If the first return segment does not start at destination, move segments from outbound until it does
             while (outbound_segments and
                    return_segments and
-                   return_segments[0].get("Departure", {}).get("location", "") != destination):
+                   (return_segments[0].get("Departure") or _EMPTY).get("location", "") != destination):
                 return_segments.insert(0, outbound_segments.pop())
                 # Stop if outbound now ends exactly at destination
-                if outbound_segments and outbound_segments[-1].get("Arrival", {}).get("location", "") == destination:
+                if outbound_segments and (outbound_segments[-1].get("Arrival") or _EMPTY).get("location", "") == destination:
                     break
         
-        print(f"✅ Split segments: {len(outbound_segments)} outbound, {len(return_segments)} return")
+        logger.debug("✅ Split segments: %s outbound, %s return", len(outbound_segments), len(return_segments))
         return outbound_segments, return_segments
     
     except Exception as e:
-        print(f"⚠️ Error splitting round-trip segments: {e}")
+        logger.warning("⚠️ Error splitting round-trip segments: %s", e)
         # Conservative fallback to midpoint
         mid_point = len(all_segments) // 2
         return all_segments[:mid_point], all_segments[mid_point:]
@@ -1195,16 +1602,23 @@ def process_flight_segments(segments: List[Dict], journey_type: str) -> Dict:
         if not segments:
             return details
         
-        # Calculate layovers
-        layover_info = calculate_layover_details(segments)
-        details[f"{prefix}layover_details"] = layover_info.get("layover_details", [])
+        # One pass over the segments for times, airlines and flight numbers
+        segment_times, airlines, flight_numbers = scan_segments(segments)
+        
+        # Calculate layovers (a direct flight has none, so skip the pass entirely)
+        num_segments = len(segments)
+        if num_segments == 1:
+            layover_details: List[LayoverDetail] = []
+        else:
+            layover_details = calculate_layover_details(segments, segment_times)["layover_details"]
+        details[f"{prefix}layover_details"] = layover_details
         
         # Get first and last segments
         first_segment = segments[0]
         last_segment = segments[-1]
         
         # Departure info
-        departure_info = first_segment.get("Departure", {})
+        departure_info = first_segment.get("Departure") or _EMPTY
         details[f"{prefix}departure_time"] = format_flight_datetime(
             departure_info.get("date", ""),
             departure_info.get("time", ""),
@@ -1213,7 +1627,7 @@ def process_flight_segments(segments: List[Dict], journey_type: str) -> Dict:
         )
         
         # Arrival info
-        arrival_info = last_segment.get("Arrival", {})
+        arrival_info = last_segment.get("Arrival") or _EMPTY
         details[f"{prefix}arrival_time"] = format_flight_datetime(
             arrival_info.get("date", ""),
             arrival_info.get("time", ""),
@@ -1221,50 +1635,36 @@ def process_flight_segments(segments: List[Dict], journey_type: str) -> Dict:
         )
         
         # Airlines and flight numbers
-        airlines = set()
-        flight_numbers = []
-        
-        for segment in segments:
-            carrier = segment.get("carrier", "")
-            if carrier:
-                airlines.add(get_airline_name(carrier))
-                
-            number = segment.get("number", "")
-            if number:
-                flight_numbers.append(f"{carrier}{number}")
-        
         if airlines:
-            details[f"{prefix}airline"] = ", ".join(airlines) if len(airlines) > 1 else list(airlines)[0]
+            details[f"{prefix}airline"] = ", ".join(airlines) if len(airlines) > 1 else next(iter(airlines))
         
         if flight_numbers:
             details[f"{prefix}flight_number"] = ", ".join(flight_numbers)
         
         # Stops information
-        num_segments = len(segments)
-        if num_segments == 1:
-            details[f"{prefix}stops"] = "Direct flight"
-        else:
-            stops_info = f"{num_segments - 1} stop(s)"
-            if layover_info.get("layover_details"):
-                layover_summary = []
-                for layover in layover_info["layover_details"]:
-                    city = layover["city"]
-                    duration = layover["duration"]
-                    layover_summary.append(f"{city} ({duration})")
-                stops_info += f" via {', '.join(layover_summary)}"
-            details[f"{prefix}stops"] = stops_info
+        details[f"{prefix}stops"] = format_stops_summary(num_segments, layover_details)
         
         # Duration
-        total_duration = calculate_total_flight_duration(segments)
+        total_duration = calculate_total_flight_duration(segments, segment_times)
         if total_duration:
             details[f"{prefix}duration"] = total_duration
             
     except Exception as e:
-        print(f"⚠️ Error processing {journey_type} segments: {e}")
+        logger.warning("⚠️ Error processing %s segments: %s", journey_type, e)
     
     return details
 
 
+def format_stops_summary(num_segments: int, layover_details: Optional[List[LayoverDetail]]) -> str:
+    """'Direct flight', 'N stop(s)' or 'N stop(s) via City (duration), ...' built in a single join"""
+    if num_segments == 1:
+        return "Direct flight"
+    if not layover_details:
+        return f"{num_segments - 1} stop(s)"
+    via = ", ".join(f"{layover['city']} ({layover['duration']})" for layover in layover_details)
+    return f"{num_segments - 1} stop(s) via {via}"
+
+
 def calculate_total_trip_duration(outbound_segments: List[Dict], return_segments: List[Dict]) -> Optional[str]:
     """Calculate total duration for the entire round trip"""
     
@@ -1273,22 +1673,20 @@ def calculate_total_trip_duration(outbound_segments: List[Dict], return_segments
             return None
         
         # Get outbound departure and return arrival
-        outbound_departure = outbound_segments[0].get("Departure", {})
-        return_arrival = return_segments[-1].get("Arrival", {})
+        outbound_departure = outbound_segments[0].get("Departure") or _EMPTY
+        return_arrival = return_segments[-1].get("Arrival") or _EMPTY
         
         dep_date = outbound_departure.get("date", "")
         dep_time = outbound_departure.get("time", "")
         arr_date = return_arrival.get("date", "")
         arr_time = return_arrival.get("time", "")
         
-        if all([dep_date, dep_time, arr_date, arr_time]):
+        if dep_date and dep_time and arr_date and arr_time:
             total_minutes = calculate_time_difference(dep_date, dep_time, arr_date, arr_time)
             if total_minutes and total_minutes > 0:
                 # Convert to days, hours, minutes for round trips
-                days = total_minutes // (24 * 60)
-                remaining_minutes = total_minutes % (24 * 60)
-                hours = remaining_minutes // 60
-                minutes = remaining_minutes % 60
+                days, remaining_minutes = divmod(total_minutes, 24 * 60)
+                hours, minutes = divmod(remaining_minutes, 60)
                 
                 duration_parts = []
                 if days > 0:
@@ -1303,52 +1701,44 @@ def calculate_total_trip_duration(outbound_segments: List[Dict], return_segments
         return None
         
     except Exception as e:
-        print(f"⚠️ Error calculating total trip duration: {e}")
+        logger.warning("⚠️ Error calculating total trip duration: %s", e)
         return None
 
 
-def calculate_layover_details(flight_segments: List[Dict]) -> Dict:
-    """Calculate detailed layover information between flight segments"""
+def calculate_layover_details(flight_segments: List[Dict],
+                              segment_times: Optional[List[Tuple[Optional[int], Optional[int]]]] = None) -> Dict:
+    """Calculate detailed layover information between flight segments.
+    segment_times may carry the parse_segment_times() result so shared segments are parsed only once.
+    """
     
-    layover_details = []
+    layover_details: List[LayoverDetail] = []
     total_layover_minutes = 0
     
     try:
-        for i in range(len(flight_segments) - 1):
-            current_flight = flight_segments[i]
-            next_flight = flight_segments[i + 1]
-            
-            # Get arrival info of current flight
-            current_arrival = current_flight.get("Arrival", {})
-            arrival_date = current_arrival.get("date", "")
-            arrival_time = current_arrival.get("time", "")
-            arrival_location = current_arrival.get("location", "")
-            
-            # Get departure info of next flight  
-            next_departure = next_flight.get("Departure", {})
-            departure_date = next_departure.get("date", "")
-            departure_time = next_departure.get("time", "")
-            
-            if all([arrival_date, arrival_time, departure_date, departure_time]):
-                layover_duration = calculate_time_difference(
-                    arrival_date, arrival_time, departure_date, departure_time
-                )
+        if segment_times is None:
+            segment_times = parse_segment_times(flight_segments)
+        
+        # Pair each flight's arrival with the next flight's departure
+        for segment, (_, arrived_at), (departs_at, _) in zip(flight_segments, segment_times, segment_times[1:]):
+            if arrived_at is not None and departs_at is not None:
+                layover_duration = max(0, (departs_at - arrived_at) // 60)
                 
-                if layover_duration and layover_duration > 0:
-                    layover_details.append({
-                        "city": get_city_name_enhanced(arrival_location),
-                        "airport_code": arrival_location,
-                        "duration": format_duration_human_readable(layover_duration),
-                        "duration_minutes": layover_duration
-                    })
+                if layover_duration > 0:
+                    arrival_location = (segment.get("Arrival") or _EMPTY).get("location", "")
+                    city = get_city_name_enhanced(arrival_location)
+                    duration = format_duration_human_readable(layover_duration)
+                    layover_details.append(LayoverDetail(
+                        city=city,
+                        airport_code=arrival_location,
+                        duration=duration,
+                        duration_minutes=layover_duration
+                    ))
                     total_layover_minutes += layover_duration
                     
-                    print(f"✅ Layover calculated: {arrival_location} ({get_city_name_enhanced(arrival_location)}) - {format_duration_human_readable(layover_duration)}")
+                    logger.debug("✅ Layover calculated: %s (%s) - %s", arrival_location, city, duration)
     
     except Exception as e:
-        print(f"⚠️ Error calculating layover details: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.warning("⚠️ Error calculating layover details: %s", e, exc_info=True)
     
     return {
         "layover_details": layover_details,
@@ -1356,171 +1746,226 @@ def calculate_layover_details(flight_segments: List[Dict]) -> Dict:
     }
 
 
+def to_epoch_seconds(date_str: str, time_str: str) -> int:
+    """Seconds since 0001-01-01 for a Travelport 'YYYY-MM-DD' date and 'HH:MM:SS' time.
+    Splits the fixed fields directly instead of running strptime; raises ValueError on bad input.
+    """
+    year, month, day = date_str.split("-")
+    hour, minute, second = time_str.split(":")
+    hour, minute, second = int(hour), int(minute), int(second)
+    if not (0 <= hour < 24 and 0 <= minute < 60 and 0 <= second < 60):
+        raise ValueError(f"time {time_str!r} is out of range")
+    return date(int(year), int(month), int(day)).toordinal() * 86400 + hour * 3600 + minute * 60 + second
+
+
 def calculate_time_difference(date1: str, time1: str, date2: str, time2: str) -> Optional[int]:
     """Calculate time difference in minutes between two datetime points"""
     
     try:
-        from datetime import datetime
-        
-        # Parse datetime strings (format: YYYY-MM-DD HH:MM:SS)
-        dt1_str = f"{date1} {time1}"
-        dt2_str = f"{date2} {time2}"
-        
-        dt1 = datetime.strptime(dt1_str, "%Y-%m-%d %H:%M:%S")
-        dt2 = datetime.strptime(dt2_str, "%Y-%m-%d %H:%M:%S")
+        seconds = to_epoch_seconds(date2, time2) - to_epoch_seconds(date1, time1)
+        return max(0, seconds // 60)  # Ensure non-negative layover time
         
-        # Calculate difference
-        time_diff = dt2 - dt1
+    except ValueError as e:
+        logger.warning("⚠️ Error calculating time difference between %s %s and %s %s: %s", date1, time1, date2, time2, e)
+        return None
+
+
+def point_epoch_seconds(point: Dict) -> Optional[int]:
+    """Epoch seconds of a segment Departure/Arrival point, or None if its date/time is missing or invalid"""
+    point_date = point.get("date", "")
+    point_time = point.get("time", "")
+    if not (point_date and point_time):
+        return None
+    try:
+        return to_epoch_seconds(point_date, point_time)
+    except ValueError as e:
+        logger.warning("⚠️ Invalid date/time %s %s: %s", point_date, point_time, e)
+        return None
+
+
+def parse_segment_times(flight_segments: List[Dict]) -> List[Tuple[Optional[int], Optional[int]]]:
+    """(departure, arrival) epoch seconds for each segment, parsed once and shared by the duration helpers"""
+    return [
+        (point_epoch_seconds(segment.get("Departure") or _EMPTY), point_epoch_seconds(segment.get("Arrival") or _EMPTY))
+        for segment in flight_segments
+    ]
+
+
+def scan_segments(flight_segments: List[Dict]) -> Tuple[List[Tuple[Optional[int], Optional[int]]], Dict[str, None], List[str]]:
+    """Walk a journey's segments once and return (segment times as in parse_segment_times,
+    insertion-ordered airline names, flight numbers)
+    """
+    segment_times: List[Tuple[Optional[int], Optional[int]]] = []
+    airlines: Dict[str, None] = {}  # Insertion-ordered set of airline names
+    flight_numbers: List[str] = []
+    
+    for segment in flight_segments:
+        segment_times.append((
+            point_epoch_seconds(segment.get("Departure") or _EMPTY),
+            point_epoch_seconds(segment.get("Arrival") or _EMPTY)
+        ))
         
-        # Return difference in minutes (ensure it's positive)
-        minutes = int(time_diff.total_seconds() / 60)
-        return max(0, minutes)  # Ensure non-negative layover time
+        carrier = segment.get("carrier", "")
+        if carrier:
+            airlines[get_airline_name(carrier)] = None
         
-    except Exception as e:
-        print(f"⚠️ Error calculating time difference between {date1} {time1} and {date2} {time2}: {e}")
-        return None
+        number = segment.get("number", "")
+        if number:
+            flight_numbers.append(f"{carrier}{number}")
+    
+    return segment_times, airlines, flight_numbers
 
 
-def calculate_total_flight_duration(flight_segments: List[Dict]) -> Optional[str]:
+def calculate_total_flight_duration(flight_segments: List[Dict],
+                                    segment_times: Optional[List[Tuple[Optional[int], Optional[int]]]] = None) -> Optional[str]:
     """Calculate total flight duration from departure to final arrival (including layovers)"""
     
     try:
         if not flight_segments:
             return None
         
-        # Get first departure and last arrival
-        first_flight = flight_segments[0]
-        last_flight = flight_segments[-1]
-        
-        first_departure = first_flight.get("Departure", {})
-        last_arrival = last_flight.get("Arrival", {})
-        
-        dep_date = first_departure.get("date", "")
-        dep_time = first_departure.get("time", "")
-        arr_date = last_arrival.get("date", "")
-        arr_time = last_arrival.get("time", "")
+        # First departure and last arrival
+        if segment_times is not None:
+            departs_at = segment_times[0][0]
+            arrives_at = segment_times[-1][1]
+        else:
+            departs_at = point_epoch_seconds(flight_segments[0].get("Departure") or _EMPTY)
+            arrives_at = point_epoch_seconds(flight_segments[-1].get("Arrival") or _EMPTY)
         
-        if all([dep_date, dep_time, arr_date, arr_time]):
-            total_minutes = calculate_time_difference(dep_date, dep_time, arr_date, arr_time)
-            if total_minutes and total_minutes > 0:
+        if departs_at is not None and arrives_at is not None:
+            total_minutes = (arrives_at - departs_at) // 60
+            if total_minutes > 0:
                 return format_duration_human_readable(total_minutes)
         
         return None
         
     except Exception as e:
-        print(f"⚠️ Error calculating total flight duration: {e}")
+        logger.warning("⚠️ Error calculating total flight duration: %s", e)
         return None
 
 
 def format_duration_human_readable(minutes: int) -> str:
     """Format duration in minutes to human readable format"""
-    
-    try:
-        if minutes <= 0:
-            return "0m"
-        
-        if minutes < 60:
-            return f"{minutes}m"
-        
-        hours = minutes // 60
-        remaining_minutes = minutes % 60
-        
-        if remaining_minutes == 0:
-            return f"{hours}h"
-        else:
-            return f"{hours}h {remaining_minutes}m"
-            
-    except:
-        return f"{minutes}m" if minutes > 0 else "0m"
+    if minutes <= 0:
+        return "0m"
+    
+    hours, remaining_minutes = divmod(minutes, 60)
+    if not hours:
+        return f"{remaining_minutes}m"
+    if not remaining_minutes:
+        return f"{hours}h"
+    return f"{hours}h {remaining_minutes}m"
+
+
+# Airport code → city display name, including major connection hubs
+_AIRPORT_CITY_NAMES = {
+    # Major Middle East connection hubs
+    'DOH': 'Doha', 'DXB': 'Dubai', 'AUH': 'Abu Dhabi', 'SHJ': 'Sharjah',
+    'MCT': 'Muscat', 'KWI': 'Kuwait City', 'BAH': 'Bahrain', 'RUH': 'Riyadh',
+    'JED': 'Jeddah', 'CAI': 'Cairo', 'AMM': 'Amman', 'BEY': 'Beirut',
+    
+    # European connection hubs
+    'IST': 'Istanbul', 'SAW': 'Istanbul Sabiha', 'FRA': 'Frankfurt', 
+    'AMS': 'Amsterdam', 'LHR': 'London Heathrow', 'LGW': 'London Gatwick',
+    'CDG': 'Paris Charles de Gaulle', 'ORY': 'Paris Orly', 'MUC': 'Munich',
+    'ZUR': 'Zurich', 'VIE': 'Vienna', 'ATH': 'Athens', 'FCO': 'Rome',
+    'MAD': 'Madrid', 'BCN': 'Barcelona', 'ARN': 'Stockholm', 'CPH': 'Copenhagen',
+    'OSL': 'Oslo', 'HEL': 'Helsinki', 'WAW': 'Warsaw', 'PRG': 'Prague',
+    
+    # Pakistan airports
+    'LHE': 'Lahore', 'KHI': 'Karachi', 'ISB': 'Islamabad', 'PEW': 'Peshawar',
+    'MUX': 'Multan', 'UET': 'Quetta', 'RYK': 'Rahim Yar Khan', 'BWP': 'Bahawalpur',
+    'SKT': 'Sialkot', 'ATG': 'Attock', 'CJL': 'Chitral',
+    
+    # Indian major airports
+    'DEL': 'Delhi', 'BOM': 'Mumbai', 'MAA': 'Chennai', 'BLR': 'Bangalore',
+    'HYD': 'Hyderabad', 'CCU': 'Kolkata', 'COK': 'Kochi', 'TRV': 'Trivandrum',
+    'AMD': 'Ahmedabad', 'PNQ': 'Pune', 'GOI': 'Goa', 'JAI': 'Jaipur',
+    
+    # Asian connection hubs
+    'SIN': 'Singapore', 'HKG': 'Hong Kong', 'NRT': 'Tokyo Narita', 
+    'HND': 'Tokyo Haneda', 'ICN': 'Seoul Incheon', 'KUL': 'Kuala Lumpur',
+    'BKK': 'Bangkok', 'TPE': 'Taipei', 'MNL': 'Manila', 'CGK': 'Jakarta',
+    'PVG': 'Shanghai Pudong', 'PEK': 'Beijing Capital', 'CAN': 'Guangzhou',
+    'SZX': 'Shenzhen', 'CTU': 'Chengdu', 'XIY': 'Xian',
+    
+    # US major airports
+    'JFK': 'New York JFK', 'LGA': 'New York LaGuardia', 'EWR': 'Newark',
+    'LAX': 'Los Angeles', 'ORD': 'Chicago O\'Hare', 'DFW': 'Dallas-Fort Worth',
+    'MIA': 'Miami', 'SFO': 'San Francisco', 'SEA': 'Seattle', 'BOS': 'Boston',
+    'ATL': 'Atlanta', 'DEN': 'Denver', 'PHX': 'Phoenix', 'LAS': 'Las Vegas',
+    
+    # Canadian airports
+    'YYZ': 'Toronto Pearson', 'YVR': 'Vancouver', 'YUL': 'Montreal',
+    'YYC': 'Calgary', 'YOW': 'Ottawa',
+    
+    # Australian/Oceania airports
+    'SYD': 'Sydney', 'MEL': 'Melbourne', 'BNE': 'Brisbane', 'PER': 'Perth',
+    'AKL': 'Auckland', 'CHC': 'Christchurch',
+    
+    # African airports
+    'JNB': 'Johannesburg', 'CPT': 'Cape Town', 'NBO': 'Nairobi', 'ADD': 'Addis Ababa',
+    'LOS': 'Lagos', 'CMN': 'Casablanca', 'TUN': 'Tunis', 'ALG': 'Algiers',
+    
+    # South American airports
+    'GRU': 'São Paulo', 'GIG': 'Rio de Janeiro', 'EZE': 'Buenos Aires',
+    'SCL': 'Santiago', 'LIM': 'Lima', 'BOG': 'Bogotá', 'UIO': 'Quito'
+}
 
 
 def get_city_name_enhanced(airport_code: str) -> str:
     """Enhanced city name mapping with major connection hubs"""
-    
-    city_mapping = {
-        # Major Middle East connection hubs
-        'DOH': 'Doha', 'DXB': 'Dubai', 'AUH': 'Abu Dhabi', 'SHJ': 'Sharjah',
-        'MCT': 'Muscat', 'KWI': 'Kuwait City', 'BAH': 'Bahrain', 'RUH': 'Riyadh',
-        'JED': 'Jeddah', 'CAI': 'Cairo', 'AMM': 'Amman', 'BEY': 'Beirut',
-        
-        # European connection hubs
-        'IST': 'Istanbul', 'SAW': 'Istanbul Sabiha', 'FRA': 'Frankfurt', 
-        'AMS': 'Amsterdam', 'LHR': 'London Heathrow', 'LGW': 'London Gatwick',
-        'CDG': 'Paris Charles de Gaulle', 'ORY': 'Paris Orly', 'MUC': 'Munich',
-        'ZUR': 'Zurich', 'VIE': 'Vienna', 'ATH': 'Athens', 'FCO': 'Rome',
-        'MAD': 'Madrid', 'BCN': 'Barcelona', 'ARN': 'Stockholm', 'CPH': 'Copenhagen',
-        'OSL': 'Oslo', 'HEL': 'Helsinki', 'WAW': 'Warsaw', 'PRG': 'Prague',
-        
-        # Pakistan airports
-        'LHE': 'Lahore', 'KHI': 'Karachi', 'ISB': 'Islamabad', 'PEW': 'Peshawar',
-        'MUX': 'Multan', 'UET': 'Quetta', 'RYK': 'Rahim Yar Khan', 'BWP': 'Bahawalpur',
-        'SKT': 'Sialkot', 'ATG': 'Attock', 'CJL': 'Chitral',
-        
-        # Indian major airports
-        'DEL': 'Delhi', 'BOM': 'Mumbai', 'MAA': 'Chennai', 'BLR': 'Bangalore',
-        'HYD': 'Hyderabad', 'CCU': 'Kolkata', 'COK': 'Kochi', 'TRV': 'Trivandrum',
-        'AMD': 'Ahmedabad', 'PNQ': 'Pune', 'GOI': 'Goa', 'JAI': 'Jaipur',
-        
-        # Asian connection hubs
-        'SIN': 'Singapore', 'HKG': 'Hong Kong', 'NRT': 'Tokyo Narita', 
-        'HND': 'Tokyo Haneda', 'ICN': 'Seoul Incheon', 'KUL': 'Kuala Lumpur',
-        'BKK': 'Bangkok', 'TPE': 'Taipei', 'MNL': 'Manila', 'CGK': 'Jakarta',
-        'PVG': 'Shanghai Pudong', 'PEK': 'Beijing Capital', 'CAN': 'Guangzhou',
-        'SZX': 'Shenzhen', 'CTU': 'Chengdu', 'XIY': 'Xian',
-        
-        # US major airports
-        'JFK': 'New York JFK', 'LGA': 'New York LaGuardia', 'EWR': 'Newark',
-        'LAX': 'Los Angeles', 'ORD': 'Chicago O\'Hare', 'DFW': 'Dallas-Fort Worth',
-        'MIA': 'Miami', 'SFO': 'San Francisco', 'SEA': 'Seattle', 'BOS': 'Boston',
-        'ATL': 'Atlanta', 'DEN': 'Denver', 'PHX': 'Phoenix', 'LAS': 'Las Vegas',
-        
-        # Canadian airports
-        'YYZ': 'Toronto Pearson', 'YVR': 'Vancouver', 'YUL': 'Montreal',
-        'YYC': 'Calgary', 'YOW': 'Ottawa',
-        
-        # Australian/Oceania airports
-        'SYD': 'Sydney', 'MEL': 'Melbourne', 'BNE': 'Brisbane', 'PER': 'Perth',
-        'AKL': 'Auckland', 'CHC': 'Christchurch',
-        
-        # African airports
-        'JNB': 'Johannesburg', 'CPT': 'Cape Town', 'NBO': 'Nairobi', 'ADD': 'Addis Ababa',
-        'LOS': 'Lagos', 'CMN': 'Casablanca', 'TUN': 'Tunis', 'ALG': 'Algiers',
-        
-        # South American airports
-        'GRU': 'São Paulo', 'GIG': 'Rio de Janeiro', 'EZE': 'Buenos Aires',
-        'SCL': 'Santiago', 'LIM': 'Lima', 'BOG': 'Bogotá', 'UIO': 'Quito'
-    }
-    
-    return city_mapping.get(airport_code, airport_code)
+    return _AIRPORT_CITY_NAMES.get(airport_code, airport_code)
+
+
+_SUMMARISED_BAGGAGE_TYPES = ("FirstCheckedBag", "CarryOn")
+_BAGGAGE_CHARGES_NOTICE = "CHGS MAY APPLY IF BAGS EXCEED TTL WT ALLOWANCE"
 
 
-def extract_baggage_allowance(terms_ref: str, terms_and_conditions_list: List[Dict]) -> str:
+def baggage_weight_info(measurements: List[Dict]) -> str:
+    """Describe the weight allowance of a BaggageItem from its Weight measurement, "" if none"""
+    weight = next((m for m in measurements if m.get("measurementType") == "Weight"), None)
+    if weight is None:
+        return ""
+    weight_value = weight.get("value", 0)
+    return f"{weight_value} {weight.get('unit', '')}" if weight_value > 0 else "No free allowance"
+
+
+def extract_baggage_allowance(terms_ref: str, terms_by_id: Dict[str, Dict],
+                              cache: Optional[Dict[str, str]] = None) -> str:
     """
     Extract baggage allowance information from terms and conditions
     
     Args:
         terms_ref: Reference ID to look up (e.g., "T0")
-        terms_and_conditions_list: List of terms and conditions from ReferenceList
+        terms_by_id: Terms and conditions from ReferenceList, indexed by id (see index_by_id)
+        cache: Optional per-response memo of terms_ref -> summary; must belong to the same terms_by_id
         
     Returns:
         str: Formatted baggage allowance information
     """
+    if cache is None:
+        return summarize_baggage_terms(terms_ref, terms_by_id)
     
+    baggage_info = cache.get(terms_ref)
+    if baggage_info is None:
+        baggage_info = cache[terms_ref] = summarize_baggage_terms(terms_ref, terms_by_id)
+    return baggage_info
+
+
+def summarize_baggage_terms(terms_ref: str, terms_by_id: Dict[str, Dict]) -> str:
+    """Build the baggage summary for one terms reference (see extract_baggage_allowance)"""
     try:
         # Find the matching terms and conditions
-        matching_terms = None
-        for terms in terms_and_conditions_list:
-            if terms.get("id") == terms_ref:
-                matching_terms = terms
-                break
+        matching_terms = terms_by_id.get(terms_ref)
         
         if not matching_terms:
-            print(f"⚠️ No matching terms found for ref: {terms_ref}")
+            logger.warning("⚠️ No matching terms found for ref: %s", terms_ref)
             return "Check with airline"
         
         baggage_allowances = matching_terms.get("BaggageAllowance", [])
         if not baggage_allowances:
-            print(f"⚠️ No baggage allowances found in terms: {terms_ref}")
+            logger.warning("⚠️ No baggage allowances found in terms: %s", terms_ref)
             return "Check with airline"
         
         # Process baggage allowances
@@ -1531,58 +1976,46 @@ def extract_baggage_allowance(terms_ref: str, terms_and_conditions_list: List[Di
             validating_airline = allowance.get("validatingAirlineCode", "")
             baggage_items = allowance.get("BaggageItem", [])
             
-            print(f"🧳 Processing baggage type: {baggage_type}")
+            logger.debug("🧳 Processing baggage type: %s", baggage_type)
+            
+            # Only checked and carry-on bags are summarised; other types contribute their text alone
+            summarise_weight = baggage_type in _SUMMARISED_BAGGAGE_TYPES
             
             for item in baggage_items:
-                included_in_price = item.get("includedInOfferPrice", "No")
-                sold_by_weight = item.get("soldByWeightInd", False)
-                measurements = item.get("Measurement", [])
                 text_info = item.get("Text", "")
                 
-                # Extract weight information
-                weight_info = ""
-                for measurement in measurements:
-                    if measurement.get("measurementType") == "Weight":
-                        weight_value = measurement.get("value", 0)
-                        weight_unit = measurement.get("unit", "")
-                        
-                        if weight_value > 0:
-                            weight_info = f"{weight_value} {weight_unit}"
+                if summarise_weight:
+                    weight_info = baggage_weight_info(item.get("Measurement", _NO_ITEMS))
+                    
+                    # Format baggage information
+                    if baggage_type == "FirstCheckedBag":
+                        included_in_price = item.get("includedInOfferPrice", "No")
+                        if included_in_price == "Yes" and weight_info and weight_info != "No free allowance":
+                            baggage_details.append(f"1st bag: {weight_info} included")
+                        elif included_in_price == "Yes":
+                            baggage_details.append(f"1st bag: Included")
                         else:
-                            weight_info = "No free allowance"
-                
-                # Format baggage information
-                if baggage_type == "FirstCheckedBag":
-                    if included_in_price == "Yes" and weight_info and weight_info != "No free allowance":
-                        baggage_details.append(f"1st bag: {weight_info} included")
-                    elif included_in_price == "Yes":
-                        baggage_details.append(f"1st bag: Included")
-                    else:
-                        if weight_info:
-                            baggage_details.append(f"1st bag: {weight_info} (fee applies)")
+                            if weight_info:
+                                baggage_details.append(f"1st bag: {weight_info} (fee applies)")
+                            else:
+                                baggage_details.append(f"1st bag: Fee applies")
+                    
+                    else:  # CarryOn
+                        if weight_info and weight_info != "No free allowance":
+                            baggage_details.append(f"Carry-on: {weight_info}")
                         else:
-                            baggage_details.append(f"1st bag: Fee applies")
-                
-                elif baggage_type == "CarryOn":
-                    if weight_info and weight_info != "No free allowance":
-                        baggage_details.append(f"Carry-on: {weight_info}")
-                    else:
-                        baggage_details.append(f"Carry-on: Standard allowance")
+                            baggage_details.append(f"Carry-on: Standard allowance")
                 
-                # Add text information if available and meaningful
-                if text_info and text_info not in ["CHGS MAY APPLY IF BAGS EXCEED TTL WT ALLOWANCE"]:
-                    # Clean up common airline text
-                    cleaned_text = text_info.replace("CHGS MAY APPLY IF BAGS EXCEED TTL WT ALLOWANCE", "").strip()
+                # Add text information if available and meaningful, minus the boilerplate charges notice
+                if text_info:
+                    cleaned_text = text_info.replace(_BAGGAGE_CHARGES_NOTICE, "").strip()
                     if cleaned_text:
                         baggage_details.append(cleaned_text)
         
         # Format final baggage information
         if baggage_details:
             # Remove duplicates while preserving order
-            unique_details = []
-            for detail in baggage_details:
-                if detail not in unique_details:
-                    unique_details.append(detail)
+            unique_details = list(dict.fromkeys(baggage_details))
             
             if len(unique_details) == 1:
                 return unique_details[0]
@@ -1596,85 +2029,146 @@ def extract_baggage_allowance(terms_ref: str, terms_and_conditions_list: List[Di
             else:
                 return "Check with airline"
                 
-    except Exception as e:
-        print(f"❌ Error extracting baggage allowance: {e}")
-        import traceback
-        traceback.print_exc()
+    except (AttributeError, KeyError, TypeError, ValueError):
+        # Malformed terms JSON; logger.exception only renders the traceback if the record is emitted
+        logger.exception("❌ Error extracting baggage allowance for ref: %s", terms_ref)
         return "Check with airline"
 
 
+_AIRLINE_NAMES = {
+    'QR': 'Qatar Airways',
+    'EK': 'Emirates',
+    'EY': 'Etihad Airways',
+    'PK': 'Pakistan International Airlines', 
+    'TK': 'Turkish Airlines',
+    'BA': 'British Airways',
+    'LH': 'Lufthansa',
+    'AF': 'Air France',
+    'KL': 'KLM',
+    'SQ': 'Singapore Airlines',
+    'CX': 'Cathay Pacific',
+    'NH': 'All Nippon Airways',
+    'JL': 'Japan Airlines',
+    'AC': 'Air Canada',
+    'DL': 'Delta Air Lines',
+    'UA': 'United Airlines',
+    'AA': 'American Airlines'
+}
+
+
 def get_airline_name(carrier_code: str) -> str:
     """Convert IATA carrier code to airline name"""
-    airline_names = {
-        'QR': 'Qatar Airways',
-        'EK': 'Emirates',
-        'EY': 'Etihad Airways',
-        'PK': 'Pakistan International Airlines', 
-        'TK': 'Turkish Airlines',
-        'BA': 'British Airways',
-        'LH': 'Lufthansa',
-        'AF': 'Air France',
-        'KL': 'KLM',
-        'SQ': 'Singapore Airlines',
-        'CX': 'Cathay Pacific',
-        'NH': 'All Nippon Airways',
-        'JL': 'Japan Airlines',
-        'AC': 'Air Canada',
-        'DL': 'Delta Air Lines',
-        'UA': 'United Airlines',
-        'AA': 'American Airlines'
-    }
-    return airline_names.get(carrier_code, carrier_code)
+    return _AIRLINE_NAMES.get(carrier_code, carrier_code)
+
+
+# Matches the PT3H40M form of ISO 8601 durations (hours and minutes both optional).
+# A single compiled match beats a find('H')/find('M') + slicing scanner on these short strings.
+_ISO_DURATION_RE = re.compile(r'PT(?:(\d+)H)?(?:(\d+)M)?')
 
 
 def parse_iso_duration(duration_str: str) -> int:
-    """Parse ISO 8601 duration string (PT3H40M) to minutes"""
-    try:
-        import re
-        # Pattern to match PT3H40M format
-        pattern = r'PT(?:(\d+)H)?(?:(\d+)M)?'
-        match = re.match(pattern, duration_str)
-        
-        if match:
-            hours = int(match.group(1) or 0)
-            minutes = int(match.group(2) or 0)
-            return hours * 60 + minutes
-        
+    """Parse ISO 8601 duration string (PT3H40M) to minutes; 0 if it is missing or not in that form"""
+    # Type check before the cache, which would raise TypeError hashing a dict/list from a malformed segment
+    if not isinstance(duration_str, str):
         return 0
-    except:
+    return _iso_duration_minutes(duration_str)
+
+
+@lru_cache(maxsize=4096)  # Durations repeat heavily across dates and carriers
+def _iso_duration_minutes(duration_str: str) -> int:
+    """Cached body of parse_iso_duration for string input"""
+    match = _ISO_DURATION_RE.match(duration_str)
+    if match is None:
         return 0
+    
+    hours, minutes = match.groups()
+    return (int(hours) if hours else 0) * 60 + (int(minutes) if minutes else 0)
+
+
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+_TWO_DIGITS = tuple(f"{n:02d}" for n in range(60))  # Zero-padded days, hours and minutes
 
 
 def format_flight_datetime(date_str: str, time_str: str, location: str = "", terminal: str = "") -> str:
     """Format flight date and time for display"""
     try:
-        from datetime import datetime
-        
-        # Parse the date (2025-08-22)
-        date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-        
-        # Parse the time (09:55:00)
-        time_obj = datetime.strptime(time_str, "%H:%M:%S")
-        
-        # Format for display
-        formatted_date = date_obj.strftime("%b %d")  # Aug 22
-        formatted_time = time_obj.strftime("%H:%M")  # 09:55
-        
-        result = f"{formatted_date} at {formatted_time}"
-        
-        if location:
-            result += f" ({location})"
-        
-        if terminal:
-            result += f" Terminal {terminal}"
-        
-        return result
-        
-    except Exception as e:
-        print(f"⚠️ Error formatting datetime: {e}")
+        # Travelport sends fixed-width 2025-08-22 / 09:55:00, so slice the fields out directly
+        month = int(date_str[5:7])
+        day = int(date_str[8:10])
+        hours = int(time_str[0:2])
+        minutes = int(time_str[3:5])
+        if not (1 <= month <= 12 and 1 <= day <= 31 and 0 <= hours < 24 and 0 <= minutes < 60):
+            raise ValueError(f"unrecognised date/time {date_str!r} {time_str!r}")
+        
+        # Format for display: Aug 22 at 09:55 (LHR) Terminal 4, built as one string
+        location_part = f" ({location})" if location else ""
+        terminal_part = f" Terminal {terminal}" if terminal else ""
+        return (f"{_MONTHS[month - 1]} {_TWO_DIGITS[day]} at {_TWO_DIGITS[hours]}:{_TWO_DIGITS[minutes]}"
+                f"{location_part}{terminal_part}")
+        
+    except (TypeError, ValueError) as e:
+        logger.warning("⚠️ Error formatting datetime: %s", e)
         return f"{date_str} {time_str}"
 
 
+def format_layover_section(header: str, layover_details: List[LayoverDetail]) -> str:
+    """Render a layover header plus one bullet per stop; empty when there are no layovers"""
+    if not layover_details:
+        return ""
+    return header + "".join([
+        f"\n   • {layover['city']} ({layover['airport_code']}) - {layover['duration']}"
+        for layover in layover_details
+    ])
+
+
+_ROUND_TRIP_TEMPLATE = """✈️ ROUND-TRIP FLIGHT FOUND! ✈️
+
+💰 Total Price: {currency} {price} (round-trip)
+
+🛫 OUTBOUND FLIGHT:
+📅 Departure: {outbound_departure_time}
+🛬 Arrival: {outbound_arrival_time}
+🏢 Airline: {outbound_airline}
+✈️ Flight: {outbound_flight_number}
+🔄 Stops: {outbound_stops}{outbound_layover_section}
+⏱️ Duration: {outbound_duration}
+
+🏠 RETURN FLIGHT:
+📅 Departure: {return_departure_time}
+🛬 Arrival: {return_arrival_time}
+🏢 Airline: {return_airline}
+✈️ Flight: {return_flight_number}
+🔄 Stops: {return_stops}{return_layover_section}
+⏱️ Duration: {return_duration}
+
+🧳 Baggage: {baggage}
+⏰ Total Trip Duration: {total_duration}
+
+❓ Would you like me to search for more options or help you with booking?"""
+
+_ONE_WAY_TEMPLATE = """✈️ FLIGHT FOUND! ✈️
+
+💰 Price: {currency} {price}
+🛫 Departure: {departure_time}
+🛬 Arrival: {arrival_time}
+🏢 Airline: {airline}
+✈️ Flight: {flight_number}
+🔄 Stops: {stops}{layover_section}
+⏱️ Duration: {duration}
+🧳 Baggage: {baggage}
+
+❓ Would you like me to search for more options or help you with booking?"""
+
+
+class _RoundTripFields(dict):
+    """Round-trip template fields; optional fields missing from the details render as N/A"""
+    
+    def __missing__(self, key: str) -> str:
+        if key in ("currency", "price"):
+            raise KeyError(key)
+        return "N/A"
+
+
 def format_flight_response(details: Dict) -> str:
     """Enhanced flight response formatting with proper round-trip detection"""
     
@@ -1686,85 +2180,36 @@ def format_flight_response(details: Dict) -> str:
     
     if trip_type == "round-trip" or (has_outbound and has_return):
         # Format round-trip response
-        print(f"🔄 Formatting round-trip response with outbound: {has_outbound}, return: {has_return}")
+        logger.debug("🔄 Formatting round-trip response with outbound: %s, return: %s", has_outbound, has_return)
         
-        outbound_layover_section = ""
-        if details.get("outbound_layover_details"):
-            outbound_layover_section = "\n🔄 Outbound Layovers:"
-            for layover in details["outbound_layover_details"]:
-                outbound_layover_section += f"\n   • {layover['city']} ({layover['airport_code']}) - {layover['duration']}"
-        
-        return_layover_section = ""
-        if details.get("return_layover_details"):
-            return_layover_section = "\n🔄 Return Layovers:"
-            for layover in details["return_layover_details"]:
-                return_layover_section += f"\n   • {layover['city']} ({layover['airport_code']}) - {layover['duration']}"
-        
-        response = f"""✈️ ROUND-TRIP FLIGHT FOUND! ✈️
-
-💰 Total Price: {details['currency']} {details['price']} (round-trip)
-
-🛫 OUTBOUND FLIGHT:
-📅 Departure: {details.get('outbound_departure_time', 'N/A')}
-🛬 Arrival: {details.get('outbound_arrival_time', 'N/A')}
-🏢 Airline: {details.get('outbound_airline', 'N/A')}
-✈️ Flight: {details.get('outbound_flight_number', 'N/A')}
-🔄 Stops: {details.get('outbound_stops', 'N/A')}{outbound_layover_section}
-⏱️ Duration: {details.get('outbound_duration', 'N/A')}
-
-🏠 RETURN FLIGHT:
-📅 Departure: {details.get('return_departure_time', 'N/A')}
-🛬 Arrival: {details.get('return_arrival_time', 'N/A')}
-🏢 Airline: {details.get('return_airline', 'N/A')}
-✈️ Flight: {details.get('return_flight_number', 'N/A')}
-🔄 Stops: {details.get('return_stops', 'N/A')}{return_layover_section}
-⏱️ Duration: {details.get('return_duration', 'N/A')}
-
-🧳 Baggage: {details.get('baggage', 'Standard')}
-⏰ Total Trip Duration: {details.get('total_duration', 'N/A')}
-
-❓ Would you like me to search for more options or help you with booking?"""
-        
-        return response
+        fields = _RoundTripFields(details)
+        fields.setdefault("baggage", "Standard")
+        fields["outbound_layover_section"] = format_layover_section("\n🔄 Outbound Layovers:", details.get("outbound_layover_details"))
+        fields["return_layover_section"] = format_layover_section("\n🔄 Return Layovers:", details.get("return_layover_details"))
+        return _ROUND_TRIP_TEMPLATE.format_map(fields)
     
     else:
         # One-way flight formatting
-        print(f"➡️ Formatting one-way response")
-        
-        layover_section = ""
-        if details.get("layover_details"):
-            layover_section = "\n🔄 Layovers:"
-            for layover in details["layover_details"]:
-                layover_section += f"\n   • {layover['city']} ({layover['airport_code']}) - {layover['duration']}"
+        logger.debug("➡️ Formatting one-way response")
         
-        response = f"""✈️ FLIGHT FOUND! ✈️
-
-💰 Price: {details['currency']} {details['price']}
-🛫 Departure: {details['departure_time']}
-🛬 Arrival: {details['arrival_time']}
-🏢 Airline: {details['airline']}
-✈️ Flight: {details['flight_number']}
-🔄 Stops: {details['stops']}{layover_section}
-⏱️ Duration: {details['duration']}
-🧳 Baggage: {details['baggage']}
-
-❓ Would you like me to search for more options or help you with booking?"""
-        
-        return response
+        layover_section = format_layover_section("\n🔄 Layovers:", details.get("layover_details"))
+        return _ONE_WAY_TEMPLATE.format_map(dict(details, layover_section=layover_section))
 
 
 # Updated workflow decision functions
 def should_search_flights(state: FlightBookingState) -> str:
     """Enhanced decision function for routing"""
-    if state.get("response_text") and "couldn't understand" in state["response_text"]:
+    get = state.get
+    response_text = get("response_text")
+    if response_text and "couldn't understand" in response_text:
         return "end"
-    if not state.get("from_city") or not state.get("to_city"):
+    if not get("from_city") or not get("to_city"):
         return "end"
     
-    search_type = state.get("search_type", "specific")
-    if search_type == "specific" and not state.get("departure_date"):
-        return "end"
-    if search_type == "range" and (not state.get("date_range_start") or not state.get("date_range_end")):
+    search_type = get("search_type", "specific")
+    if search_type == "specific":
+        return "search" if get("departure_date") else "end"
+    if search_type == "range" and (not get("date_range_start") or not get("date_range_end")):
         return "end"
     
     return "search"
@@ -1775,11 +2220,12 @@ def should_analyze_flights(state: FlightBookingState) -> str:
     search_type = state.get("search_type", "specific")
     
     if search_type == "specific":
-        return "analyze" if state.get("raw_api_response") else "end"
+        results_key = "raw_api_response"
     elif search_type == "range":
-        return "analyze" if state.get("bulk_search_results") else "end"
+        results_key = "bulk_search_results"
     else:
         return "end"
+    return "analyze" if state.get(results_key) else "end"
 
 
 def parse_human_duration_to_minutes(duration_text: str) -> Optional[int]:
@@ -1787,7 +2233,6 @@ def parse_human_duration_to_minutes(duration_text: str) -> Optional[int]:
     Returns None if parsing fails.
     """
     try:
-        import re
         text = (duration_text or "").strip().lower()
         if not text:
             return None
@@ -1836,34 +2281,26 @@ def search_roundtrip_flights(state: FlightBookingState) -> FlightBookingState:
             state["response_text"] = "Return date is required for a round-trip search."
             return state
 
-        # Build API payload (payload builder already supports return_date)
-        payload = build_flight_search_payload(
-            from_city=from_city,
-            to_city=to_city,
-            departure_date=departure_date,
-            return_date=return_date,
-            passengers=passengers,
-            passenger_age=passenger_age,
+        # Payload builder already supports return_date
+        api_result = search_catalog_cached(
+            from_city, to_city, departure_date, return_date, passengers, passenger_age
         )
-
-        headers = get_api_headers()
-        response = requests.post(CATALOG_URL, headers=headers, json=payload)
-        response.raise_for_status()
-
-        api_result = response.json()
         state["raw_api_response"] = api_result
-        print("✅ Round-trip API call completed")
+        logger.info("✅ Round-trip API call completed")
         return state
 
     except Exception as e:
-        print(f"❌ Round-trip flight search error: {e}")
+        logger.error("❌ Round-trip flight search error: %s", e)
         state["response_text"] = f"😔 Sorry, I couldn't search for round-trip flights. Error: {str(e)}"
         return state
 
 
-def extract_flight_details(flight_offering: Dict, state: FlightBookingState, override_date: Optional[str] = None) -> Dict:
+def extract_flight_details(flight_offering: Dict, state: FlightBookingState, override_date: Optional[str] = None,
+                           priced_brand: Optional[Tuple[Optional[Dict], Optional[Dict]]] = None) -> Dict:
     """Extract enhanced one-way journey details (price, times, airline, stops, layovers) from a single offering.
     Uses ReferenceList in the raw API response to resolve flight segments and terms & conditions.
+    priced_brand is the (ProductBrandOption, ProductBrandOffering) already found to be the offering's
+    cheapest (see iter_offering_prices); without it the offering is scanned for its cheapest brand.
     """
     details: Dict[str, any] = {
         "price": "N/A",
@@ -1880,87 +2317,69 @@ def extract_flight_details(flight_offering: Dict, state: FlightBookingState, ove
     }
 
     try:
-        # 1) Find cheapest price within offering and capture refs/terms
-        cheapest_price = float("inf")
+        # 1) Find cheapest price within offering (unless the caller already did) and capture refs/terms
+        best_option, best_brand = priced_brand or (None, None)
+        if best_brand is None:
+            _, _, best_option, best_brand = min(
+                iter_offering_prices((flight_offering,)), key=itemgetter(0), default=_UNPRICED
+            )
+
         best_flight_refs: List[str] = []
-        best_currency = "EUR"
         best_terms_ref: Optional[str] = None
+        if best_brand is not None:
+            best_flight_refs = best_option.get("flightRefs", [])
+            best_price = best_brand["BestCombinablePrice"]
+            details["price"] = str(best_price["TotalPrice"])
+            currency_info = best_price.get("CurrencyCode", {})
+            if isinstance(currency_info, dict):
+                details["currency"] = currency_info.get("value", "EUR")
+            terms = best_brand.get("TermsAndConditions", {})
+            if isinstance(terms, dict):
+                best_terms_ref = terms.get("termsAndConditionsRef")
 
-        for option in flight_offering.get("ProductBrandOptions", []):
-            flight_refs = option.get("flightRefs", [])
-            for brand in option.get("ProductBrandOffering", []):
-                best_price = brand.get("BestCombinablePrice", {})
-                if isinstance(best_price, dict) and best_price.get("TotalPrice") is not None:
-                    price = float(best_price["TotalPrice"])
-                    if price < cheapest_price:
-                        cheapest_price = price
-                        best_flight_refs = flight_refs
-                        details["price"] = str(best_price["TotalPrice"])
-                        currency_info = best_price.get("CurrencyCode", {})
-                        if isinstance(currency_info, dict):
-                            best_currency = currency_info.get("value", "EUR")
-                        details["currency"] = best_currency
-                        terms = brand.get("TermsAndConditions", {})
-                        if isinstance(terms, dict):
-                            best_terms_ref = terms.get("termsAndConditionsRef")
-
-        print(f"🔍 Best flight refs: {best_flight_refs}")
-        print(f"🔍 Best terms & conditions ref: {best_terms_ref}")
-
-        # 2) Resolve flight segments and terms from ReferenceList
-        api = state.get("raw_api_response", {})
-        reference_list = (
-            api.get("CatalogProductOfferingsResponse", {})
-            .get("ReferenceList", [])
-        )
+        logger.debug("🔍 Best flight refs: %s", best_flight_refs)
+        logger.debug("🔍 Best terms & conditions ref: %s", best_terms_ref)
 
-        flight_reference_list = None
-        terms_and_conditions_list = None
-        for ref_list in reference_list:
-            if ref_list.get("@type") == "ReferenceListFlight":
-                flight_reference_list = ref_list.get("Flight", [])
-            elif ref_list.get("@type") == "ReferenceListTermsAndConditions":
-                terms_and_conditions_list = ref_list.get("TermsAndConditions", [])
+        # 2) Resolve flight segments and terms from the ReferenceList index (built once per response)
+        flight_by_id, terms_by_id, baggage_by_ref = get_reference_index(state)
 
-        flight_segments: List[Dict] = []
-        airlines: set[str] = set()
+        keyed_segments: List[Tuple[str, str, Dict]] = []
+        airlines: Dict[str, None] = {}  # Insertion-ordered set of airline names
         flight_numbers: List[str] = []
         total_duration_minutes = 0
 
-        if best_flight_refs and flight_reference_list:
+        if best_flight_refs and flight_by_id:
             for ref in best_flight_refs:
-                for flight in flight_reference_list:
-                    if flight.get("id") == ref:
-                        flight_segments.append(flight)
-                        carrier = flight.get("carrier", "")
-                        if carrier:
-                            airlines.add(get_airline_name(carrier))
-                        number = flight.get("number", "")
-                        if number:
-                            flight_numbers.append(f"{carrier}{number}")
-                        # ISO8601 PTxHxM
-                        dur = flight.get("duration", "")
-                        if dur:
-                            minutes = parse_iso_duration(dur)
-                            total_duration_minutes += minutes
-                        break
-
-        # Sort segments by departure chronology
-        flight_segments.sort(
-            key=lambda x: (
-                x.get("Departure", {}).get("date", ""),
-                x.get("Departure", {}).get("time", ""),
-            )
-        )
+                flight = flight_by_id.get(ref)
+                if flight is None:
+                    continue
+                keyed_segments.append((*segment_departure_key(flight), flight))
+                carrier = flight.get("carrier", "")
+                if carrier:
+                    airlines[get_airline_name(carrier)] = None
+                number = flight.get("number", "")
+                if number:
+                    flight_numbers.append(f"{carrier}{number}")
+                # ISO8601 PTxHxM
+                dur = flight.get("duration", "")
+                if dur:
+                    minutes = parse_iso_duration(dur)
+                    total_duration_minutes += minutes
+
+        # Sort segments by departure chronology on the keys taken while resolving them
+        keyed_segments.sort(key=itemgetter(0, 1))
+        flight_segments = [keyed[2] for keyed in keyed_segments]
 
         if flight_segments:
-            # Layovers
-            layover_info = calculate_layover_details(flight_segments)
-            details.update(layover_info)
+            # Layovers (segment times are parsed once and shared with the duration below);
+            # direct flights keep the empty defaults
+            segment_times = parse_segment_times(flight_segments)
+            if len(flight_segments) > 1:
+                details.update(calculate_layover_details(flight_segments, segment_times))
 
             # First departure
             first_seg = flight_segments[0]
-            dep = first_seg.get("Departure", {})
+            dep = first_seg.get("Departure") or _EMPTY
             dep_loc = dep.get("location", "")
             dep_date = dep.get("date", "")
             dep_time = dep.get("time", "")
@@ -1970,7 +2389,7 @@ def extract_flight_details(flight_offering: Dict, state: FlightBookingState, ove
 
             # Last arrival
             last_seg = flight_segments[-1]
-            arr = last_seg.get("Arrival", {})
+            arr = last_seg.get("Arrival") or _EMPTY
             arr_loc = arr.get("location", "")
             arr_date = arr.get("date", "")
             arr_time = arr.get("time", "")
@@ -1979,28 +2398,17 @@ def extract_flight_details(flight_offering: Dict, state: FlightBookingState, ove
 
             # Airlines
             if airlines:
-                details["airline"] = ", ".join(airlines) if len(airlines) > 1 else list(airlines)[0]
+                details["airline"] = ", ".join(airlines) if len(airlines) > 1 else next(iter(airlines))
 
             # Stops
-            num_segments = len(flight_segments)
-            if num_segments == 1:
-                details["stops"] = "Direct flight"
-            else:
-                if details.get("layover_details"):
-                    layover_summary = ", ".join(
-                        f"{l['city']} ({l['duration']})" for l in details["layover_details"]
-                    )
-                    details["stops"] = f"{num_segments - 1} stop(s) via {layover_summary}"
-                else:
-                    details["stops"] = f"{num_segments - 1} stop(s)"
+            details["stops"] = format_stops_summary(len(flight_segments), details.get("layover_details"))
 
             # Duration
-            total_travel = calculate_total_flight_duration(flight_segments)
+            total_travel = calculate_total_flight_duration(flight_segments, segment_times)
             if total_travel:
                 details["duration"] = total_travel
             elif total_duration_minutes > 0:
-                hours = total_duration_minutes // 60
-                minutes = total_duration_minutes % 60
+                hours, minutes = divmod(total_duration_minutes, 60)
                 details["duration"] = f"{hours}h {minutes}m" if hours else f"{minutes}m"
 
             # Flight numbers
@@ -2008,16 +2416,16 @@ def extract_flight_details(flight_offering: Dict, state: FlightBookingState, ove
                 details["flight_number"] = ", ".join(flight_numbers)
 
         # 3) Baggage
-        if best_terms_ref and terms_and_conditions_list:
-            bag = extract_baggage_allowance(best_terms_ref, terms_and_conditions_list)
+        if best_terms_ref and terms_by_id:
+            bag = extract_baggage_allowance(best_terms_ref, terms_by_id, baggage_by_ref)
             if bag:
                 details["baggage"] = bag
 
-        print(f"✅ Enhanced one-way details extracted: {details}")
+        logger.debug("✅ Enhanced one-way details extracted: %s", details)
         return details
 
     except Exception as e:
-        print(f"❌ Error extracting flight details: {e}")
+        logger.error("❌ Error extracting flight details: %s", e)
         return details
 
 
@@ -2051,35 +2459,45 @@ def _select_cheapest_brand_offering(offering: Dict) -> Tuple[Optional[Dict], Opt
     for option in offering.get("ProductBrandOptions", []):
         brand_offerings = option.get("ProductBrandOffering", [])
         for brand_off in brand_offerings:
-            price_info = brand_off.get("BestCombinablePrice", {})
-            if isinstance(price_info, dict) and price_info.get("TotalPrice") is not None:
-                price = float(price_info["TotalPrice"])
-                if price < cheapest_price:
-                    cheapest = brand_off
-                    cheapest_price = price
-                    brand = brand_off.get("Brand", {})
-                    if isinstance(brand, dict):
-                        cheapest_brand_ref = brand.get("BrandRef")
-                    # First productRef if present
-                    prod_list = brand_off.get("Product", [])
-                    if prod_list and isinstance(prod_list[0], dict):
-                        cheapest_product_ref = prod_list[0].get("productRef")
+            try:
+                price = float(brand_off["BestCombinablePrice"]["TotalPrice"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if price < cheapest_price:
+                cheapest = brand_off
+                cheapest_price = price
+                brand = brand_off.get("Brand", {})
+                if isinstance(brand, dict):
+                    cheapest_brand_ref = brand.get("BrandRef")
+                # First productRef if present
+                prod_list = brand_off.get("Product", [])
+                if prod_list and isinstance(prod_list[0], dict):
+                    cheapest_product_ref = prod_list[0].get("productRef")
     return cheapest, cheapest_brand_ref, cheapest_product_ref
 
 
+def quote_reference_prefix(state: FlightBookingState) -> str:
+    """Per-quote part of the reference basis: transactionId, user and a nonce.
+
+    Cached search responses (and their transactionId) are shared between conversations,
+    so the transactionId alone would hand two customers quoting the same flight the same REF.
+    """
+    api = state.get("raw_api_response", {})
+    tx = (
+        api.get("CatalogProductOfferingsResponse", {})
+        .get("transactionId", "")
+    )
+    return f"{tx}|{state.get('user_id', '')}|{uuid4().hex}"
+
+
 def generate_quote_reference_for_offering(state: FlightBookingState, offering: Dict) -> str:
     """Generate a short, human-quotable reference using transactionId + offering metadata.
-    Format: TT-<5charhash>
+    Format: TT-<8charhash>
     """
     try:
-        api = state.get("raw_api_response", {})
-        tx = (
-            api.get("CatalogProductOfferingsResponse", {})
-            .get("transactionId", "")
-        )
         offering_id = offering.get("id", "")
         _cheapest, brand_ref, product_ref = _select_cheapest_brand_offering(offering)
-        basis = f"{tx}|{offering_id}|{brand_ref or ''}|{product_ref or ''}"
+        basis = f"{quote_reference_prefix(state)}|{offering_id}|{brand_ref or ''}|{product_ref or ''}"
         short = sha1(basis.encode("utf-8")).hexdigest()[:8].upper()
         return f"TT-{short}"
     except Exception:
@@ -2089,20 +2507,29 @@ def generate_quote_reference_for_offering(state: FlightBookingState, offering: D
 
 def generate_quote_reference_for_roundtrip(state: FlightBookingState, outbound_off: Dict, return_off: Dict) -> str:
     try:
-        api = state.get("raw_api_response", {})
-        tx = (
-            api.get("CatalogProductOfferingsResponse", {})
-            .get("transactionId", "")
-        )
         out_id = outbound_off.get("id", "")
         ret_id = return_off.get("id", "")
-        basis = f"{tx}|{out_id}+{ret_id}"
+        basis = f"{quote_reference_prefix(state)}|{out_id}+{ret_id}"
         short = sha1(basis.encode("utf-8")).hexdigest()[:8].upper()
         return f"TT-{short}"
     except Exception:
         return f"TT-{int(time.time())}"
 
 
+def remember_quote_reference(state: FlightBookingState, quote_code: str) -> None:
+    """Store the quote reference on the state and, best effort, in the user's flight memory"""
+    state["quote_reference"] = quote_code
+    try:
+        # Imported here on purpose: importing memory_service connects to DynamoDB (or sets up its mock),
+        # which importing the agent on its own, e.g. in tests, should not do
+        from ..services.memory_service import memory_manager
+        memory_manager.add_flight_context(state.get("user_id", "unknown"), {
+            "last_quote_reference": quote_code
+        })
+    except Exception as e:
+        logger.debug("Could not persist quote reference %s: %s", quote_code, e)
+
+
 def append_booking_instructions(text: str, quote_code: str) -> str:
     """Append a standardized booking instruction line."""
     line = f"\n\nTo book: please quote REF {quote_code} to +306945169169 to proceed."
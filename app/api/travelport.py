@@ -3,9 +3,26 @@ Travelport API authentication and header management
 """
 
 import os
+import json
+import logging
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Dict, Any, Optional
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+if not ORJSON_AVAILABLE:
+    logger.warning("⚠️ orjson not available, falling back to standard json")
+
 
 # Travelport API Configuration
 CLIENT_ID = os.getenv("TRAVELPORT_APPLICATION_KEY")
@@ -17,14 +34,67 @@ ACCESS_GROUP = os.getenv("TRAVELPORT_ACCESS_GROUP")
 OAUTH_URL = "https://oauth.pp.travelport.com/oauth/oauth20/token"
 CATALOG_URL = "https://api.pp.travelport.com/11/air/catalog/search/catalogproductofferings"
 
+# (connect, read) timeouts in seconds; catalog searches can take a while to price
+REQUEST_TIMEOUT = (3.05, 30)
+
+# Shared keep-alive session so bulk searches reuse TCP/TLS connections.
+# Catalog searches and token requests are safe to repeat, so POST is retried on throttling
+# and gateway errors with our own short backoff. Retry-After is ignored so one throttled call
+# cannot park a shared search worker for as long as the server asks, and the last response
+# is returned (not turned into a RetryError) so callers' raise_for_status() reports it.
+_SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=16,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[429, 502, 503, 504],
+        allowed_methods=frozenset({"POST"}),
+        raise_on_status=False,
+        respect_retry_after_header=False
+    )
+)
+_SESSION.mount("https://", _adapter)
+
+# OAuth access token shared across requests until shortly before it expires
+TOKEN_EXPIRY_MARGIN = 60  # seconds
+_token_lock = threading.Lock()
+_cached_token: Optional[str] = None
+_cached_token_expires_at = 0.0
+
 
 def fetch_password_token() -> str:
     """
-    Get OAuth token from Travelport API
+    Get OAuth token from Travelport API, reusing the last one until it is about to expire
     
     Returns:
         str: Access token for API authentication
         
+    Raises:
+        requests.HTTPError: If authentication fails
+    """
+    global _cached_token, _cached_token_expires_at
+    
+    with _token_lock:
+        if _cached_token and time.monotonic() < _cached_token_expires_at:
+            return _cached_token
+        
+        token_response = request_password_token()
+        _cached_token = token_response["access_token"]
+        # Without an expires_in the token is used for this call only
+        expires_in = float(token_response.get("expires_in") or 0)
+        _cached_token_expires_at = time.monotonic() + expires_in - TOKEN_EXPIRY_MARGIN
+        return _cached_token
+
+
+def request_password_token() -> Dict[str, Any]:
+    """
+    Request a fresh OAuth token from Travelport (password grant)
+    
+    Returns:
+        Dict: Token response including access_token and expires_in
+        
     Raises:
         requests.HTTPError: If authentication fails
     """
@@ -37,13 +107,14 @@ def fetch_password_token() -> str:
         "scope": "openid"
     }
     
-    response = requests.post(
+    response = _SESSION.post(
         OAUTH_URL,
         headers={"Content-Type": "application/x-www-form-urlencoded"},
-        data=data
+        data=data,
+        timeout=REQUEST_TIMEOUT
     )
     response.raise_for_status()
-    return response.json()["access_token"]
+    return response.json()
 
 
 def get_api_headers() -> Dict[str, str]:
@@ -73,6 +144,35 @@ def get_api_headers() -> Dict[str, str]:
     }
 
 
+def post_catalog_search(payload: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """
+    POST a catalog search payload and decode the JSON response
+    
+    Uses orjson for both encoding and decoding when available (much faster on
+    large catalog responses); the headers already declare application/json.
+    Either way the UTF-8 body bytes are parsed directly, never via response.text.
+    
+    Args:
+        payload: Complete flight search payload for Travelport API
+        headers: Headers from get_api_headers()
+        
+    Returns:
+        Dict containing the decoded API response
+        
+    Raises:
+        requests.HTTPError: If API call fails
+    """
+    if ORJSON_AVAILABLE:
+        response = _SESSION.post(CATALOG_URL, headers=headers, data=orjson.dumps(payload), timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return orjson.loads(response.content)
+    
+    response = _SESSION.post(CATALOG_URL, headers=headers, json=payload, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    # Decode the raw bytes: response.json() would first run charset detection over the whole body
+    return json.loads(response.content)
+
+
 def search_flights(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """
     Execute flight search with Travelport API using provided payload
@@ -88,10 +188,8 @@ def search_flights(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """
     try:
         headers = get_api_headers()
-        response = requests.post(CATALOG_URL, headers=headers, json=payload)
-        response.raise_for_status()
-        return response.json()
+        return post_catalog_search(payload, headers)
         
     except Exception as e:
-        print(f"❌ Flight search API error: {e}")
+        logger.error("❌ Flight search API error: %s", e)
         return {"error": str(e), "status": "failed"} 
\ No newline at end of file
@@ -7,6 +7,10 @@ import os
 import uvicorn
 import asyncio
 import sys
+import atexit
+import logging
+import logging.handlers
+import queue
 import time
 import hmac
 import hashlib
@@ -43,6 +47,48 @@ from .services.memory_service import memory_manager
 # Load environment variables
 load_dotenv()
 
+
+def resolve_log_level(value: str) -> Optional[int]:
+    """Turn a LOG_LEVEL value, a name such as "debug" or a number such as "10", into a logging level; None if unknown"""
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    level = logging.getLevelName(value.upper())
+    return level if isinstance(level, int) else None
+
+
+def configure_logging() -> None:
+    """Route log records through a queue so request threads never block on stdout.
+    Level comes from LOG_LEVEL (default INFO; an unknown value falls back to INFO with a warning).
+    Safe to call again (e.g. on module reload): if the root logger already has a QueueHandler,
+    nothing new is installed.
+    """
+    root = logging.getLogger()
+    if any(isinstance(handler, logging.handlers.QueueHandler) for handler in root.handlers):
+        return
+    
+    # Resolve the level before starting the listener thread, so a bad value can't fail halfway through
+    log_level_setting = os.getenv("LOG_LEVEL", "INFO")
+    log_level = resolve_log_level(log_level_setting)
+    
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    
+    root.setLevel(logging.INFO if log_level is None else log_level)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    
+    if log_level is None:
+        logging.getLogger(__name__).warning("⚠️ Unknown LOG_LEVEL %r, using INFO", log_level_setting)
+
+
+configure_logging()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="WhatsApp Flight Booking Bot", 
@@ -2,8 +2,9 @@
 Data models, schemas, and state definitions for the flight booking bot
 """
 
-from typing import Dict, List, Optional, Union, Any
-from pydantic import BaseModel
+import re
+from typing import Dict, List, Optional, Tuple, Union, Any
+from pydantic import BaseModel, field_validator
 from typing_extensions import TypedDict
 from langchain_core.messages import HumanMessage, AIMessage
 
@@ -63,6 +64,81 @@ class ConversationResponse(BaseModel):
     notes: Optional[str] = None  # Brief rationale for logs
 
 
+_LEADING_NUMBER_RE = re.compile(r"\d+")
+
+
+def _lenient_int(value: Any) -> Optional[int]:
+    """Best-effort whole number from an LLM value: 5, 5.0, 5.5, "5" and "5 days" all give 5; anything else None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        try:
+            return int(value)
+        except (OverflowError, ValueError):  # inf / nan
+            return None
+    if isinstance(value, str):
+        match = _LEADING_NUMBER_RE.search(value)
+        return int(match.group()) if match else None
+    return None
+
+
+# Schema for the LLM's travel-request JSON; validated straight from the raw text in one pass.
+# Validation is lenient: an odd optional value is coerced or dropped instead of failing the whole parse.
+class ParsedTravelRequest(BaseModel):
+    """Flight search fields extracted by parse_travel_request (unknown keys are ignored)"""
+    from_city: Optional[str] = None  # IATA code
+    to_city: Optional[str] = None  # IATA code
+    departure_date: Optional[str] = None  # YYYY-MM-DD
+    return_date: Optional[str] = None  # YYYY-MM-DD
+    passengers: Optional[int] = 1
+    passenger_age: Optional[int] = 25
+    search_type: Optional[str] = "specific"  # "specific" | "range"
+    trip_type: Optional[str] = "one-way"  # "one-way" | "round-trip"
+    duration_days: Optional[int] = None
+    date_range_start: Optional[str] = None  # YYYY-MM-DD
+    date_range_end: Optional[str] = None  # YYYY-MM-DD
+    range_description: Optional[str] = None
+    
+    @field_validator(
+        "from_city", "to_city", "departure_date", "return_date", "search_type", "trip_type",
+        "date_range_start", "date_range_end", "range_description", mode="before"
+    )
+    @classmethod
+    def _text_or_none(cls, value: Any) -> Optional[str]:
+        """Keep strings, stringify numbers, drop anything else (lists, objects)"""
+        if value is None or isinstance(value, str):
+            return value
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return str(value)
+        return None
+    
+    @field_validator("duration_days", mode="before")
+    @classmethod
+    def _duration_days(cls, value: Any) -> Optional[int]:
+        return _lenient_int(value)
+    
+    @field_validator("passengers", mode="before")
+    @classmethod
+    def _passengers(cls, value: Any) -> int:
+        passengers = _lenient_int(value)
+        return passengers if passengers else 1
+    
+    @field_validator("passenger_age", mode="before")
+    @classmethod
+    def _passenger_age(cls, value: Any) -> int:
+        age = _lenient_int(value)
+        return age if age is not None else 25
+
+
+# Fixed-shape layover record; a plain dict at runtime so formatters keep indexing by key
+class LayoverDetail(TypedDict):
+    """One connection stop as produced by calculate_layover_details"""
+    city: str
+    airport_code: str
+    duration: str  # Human readable, e.g. "3h 30m"
+    duration_minutes: int
+
+
 # State Definition for LangGraph (keeping backward compatibility)
 class FlightBookingState(TypedDict):
     messages: List[Union[HumanMessage, AIMessage]]
@@ -87,8 +163,10 @@ class FlightBookingState(TypedDict):
     date_range_end: Optional[str]  # End date for range searches
     range_description: Optional[str]  # Human-readable description of range
     bulk_search_results: Optional[Dict[str, Dict[str, Any]]]  # date -> api_response mapping
+    bulk_cheapest_by_date: Optional[Dict[str, Tuple[float, Optional[Dict[str, Any]], Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]]  # date -> (lowest price, offering, option, brand offering), reduced during the search
     search_dates: Optional[List[str]]  # List of dates that were searched
     best_departure_date: Optional[str]  # Best date found in range search
+    reference_index: Optional[Tuple[Dict[str, Any], Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]], Dict[str, str]]]  # (raw_api_response, flight_by_id, terms_by_id, baggage_by_ref) cache
 
 
 # Flight details response model
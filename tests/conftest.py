@@ -0,0 +1,10 @@
+"""
+Shared pytest setup: make the app package importable and give the agent's LLM client a placeholder key
+(the flight agent builds its Gemini client at import time; tests never call it)
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GOOGLE_API_KEY", "test-key")
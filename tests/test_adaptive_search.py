@@ -0,0 +1,148 @@
+"""
+Tests for the adaptive date-range search: it must take no more rounds of concurrent API calls
+than uniform sampling while landing at least as close to the cheapest departure day
+"""
+
+import math
+from datetime import date, timedelta
+
+import pytest
+
+import app.agents.flight_booking_agent as agent
+
+RANGE_START = date(2025, 9, 1)
+
+
+def priced_response(price):
+    """Catalog response with a single offering at the given price"""
+    return {
+        "CatalogProductOfferingsResponse": {
+            "CatalogProductOfferings": {
+                "CatalogProductOffering": [{
+                    "id": "o1",
+                    "ProductBrandOptions": [{
+                        "flightRefs": [],
+                        "ProductBrandOffering": [{"BestCombinablePrice": {"TotalPrice": price}}]
+                    }]
+                }]
+            }
+        }
+    }
+
+
+class FakeCatalog:
+    """Stands in for the Travelport API: prices each departure day with price_for_day and records calls"""
+    
+    def __init__(self, price_for_day):
+        self.price_for_day = price_for_day
+        self.calls = []
+        self.batches = []
+    
+    def fetch(self, from_city, to_city, departure_date, *args):
+        self.calls.append(departure_date)
+        return priced_response(self.price_for_day((date.fromisoformat(departure_date) - RANGE_START).days))
+    
+    @property
+    def rounds(self) -> int:
+        """Sequential rounds of requests, given BULK_SEARCH_MAX_WORKERS run at once"""
+        return sum(math.ceil(size / agent.BULK_SEARCH_MAX_WORKERS) for size in self.batches)
+
+
+@pytest.fixture
+def use_catalog(monkeypatch):
+    """Route searches to a FakeCatalog (through the real search cache)"""
+    search_dates_concurrently = agent.search_dates_concurrently
+    
+    def install(price_for_day):
+        catalog = FakeCatalog(price_for_day)
+        
+        def counting_search(dates, *args):
+            catalog.batches.append(len(dates))
+            return search_dates_concurrently(dates, *args)
+        
+        monkeypatch.setattr(agent, "fetch_catalog_search", catalog.fetch)
+        monkeypatch.setattr(agent, "search_dates_concurrently", counting_search)
+        agent._search_cache.clear()
+        return catalog
+    
+    monkeypatch.setattr(agent, "SEARCH_CACHE_DISABLED", False)
+    monkeypatch.setattr(agent, "get_api_headers", lambda: {})
+    yield install
+    agent._search_cache.clear()
+
+
+def run_search(search, total_days):
+    state = {
+        "from_city": "KHI",
+        "to_city": "DXB",
+        "date_range_start": RANGE_START.isoformat(),
+        "date_range_end": (RANGE_START + timedelta(days=total_days - 1)).isoformat(),
+    }
+    return search(state)
+
+
+def cheapest_day(state):
+    best_date = min(state["bulk_cheapest_by_date"], key=lambda d: state["bulk_cheapest_by_date"][d][0])
+    return (date.fromisoformat(best_date) - RANGE_START).days
+
+
+def valley(bottom_day):
+    return lambda day: 300 + 7 * abs(day - bottom_day)
+
+
+def test_forty_day_valley_against_uniform_sampling(use_catalog):
+    adaptive = use_catalog(valley(23))
+    adaptive_state = run_search(agent.search_flights_bulk_adaptive, 40)
+    
+    uniform = use_catalog(valley(23))
+    uniform_state = run_search(agent.search_flights_bulk, 40)
+    
+    # Same two rounds of requests, one extra call, and the exact cheapest day instead of a neighbour
+    assert (len(adaptive.calls), adaptive.rounds) == (16, 2)
+    assert (len(uniform.calls), uniform.rounds) == (15, 2)
+    assert cheapest_day(adaptive_state) == 23
+    assert cheapest_day(uniform_state) == 22
+
+
+@pytest.mark.parametrize("total_days", [20, 30, 60, 90])
+def test_never_slower_or_further_off_than_uniform_sampling(use_catalog, total_days):
+    adaptive_misses, uniform_misses = [], []
+    
+    for bottom_day in range(total_days):
+        adaptive = use_catalog(valley(bottom_day))
+        adaptive_state = run_search(agent.search_flights_bulk_adaptive, total_days)
+        assert adaptive.rounds <= 2
+        assert len(adaptive.calls) <= 2 * agent.BULK_SEARCH_MAX_WORKERS
+        adaptive_misses.append(abs(cheapest_day(adaptive_state) - bottom_day))
+        
+        use_catalog(valley(bottom_day))
+        uniform_misses.append(abs(cheapest_day(run_search(agent.search_flights_bulk, total_days)) - bottom_day))
+    
+    assert max(adaptive_misses) <= max(uniform_misses)
+    if total_days <= 30:
+        assert max(adaptive_misses) == 0
+
+
+@pytest.mark.parametrize("cache_disabled", [False, True])
+def test_multi_valley_prices_fall_back_to_uniform_sampling_without_repeating_calls(use_catalog, monkeypatch,
+                                                                                  cache_disabled):
+    monkeypatch.setattr(agent, "SEARCH_CACHE_DISABLED", cache_disabled)
+    catalog = use_catalog(lambda day: 300 + 7 * min(abs(day - 8), abs(day - 50)))
+    state = run_search(agent.search_flights_bulk_adaptive, 60)
+    
+    # The first batch is part of the uniform sample, so only the other 7 days are new calls
+    assert (len(catalog.calls), catalog.rounds) == (agent.BULK_SEARCH_MAX_DATES, 2)
+    assert len(set(catalog.calls)) == len(catalog.calls)
+    assert state["search_dates"] == agent.generate_date_range(
+        state["date_range_start"], state["date_range_end"], agent.BULK_SEARCH_MAX_DATES
+    )
+    assert list(state["bulk_search_results"]) == state["search_dates"]
+    assert cheapest_day(state) == 8
+
+
+def test_short_ranges_search_every_day(use_catalog):
+    catalog = use_catalog(valley(4))
+    state = run_search(agent.search_flights_bulk_adaptive, 10)
+    
+    assert len(catalog.calls) == 10
+    assert cheapest_day(state) == 4
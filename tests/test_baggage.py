@@ -0,0 +1,64 @@
+"""
+Tests for baggage summaries: the weight of a single BaggageItem and known summaries for typical terms
+"""
+
+import pytest
+
+import app.agents.flight_booking_agent as agent
+
+
+def weight_measurement(value, unit="Kilograms"):
+    return {"measurementType": "Weight", "value": value, "unit": unit}
+
+
+@pytest.mark.parametrize("measurements, info", [
+    ([weight_measurement(23)], "23 Kilograms"),
+    ([weight_measurement(50, "Pounds")], "50 Pounds"),
+    ([{"measurementType": "Weight", "value": 7}], "7 "),
+    ([weight_measurement(0)], "No free allowance"),
+    ([{"measurementType": "Weight"}], "No free allowance"),
+    ([{"measurementType": "Pieces", "value": 2}, weight_measurement(30)], "30 Kilograms"),
+    ([{"measurementType": "Pieces", "value": 2}], ""),
+    ([], ""),
+    # The first Weight entry wins (the old loop let the last one overwrite it)
+    ([weight_measurement(23), weight_measurement(32)], "23 Kilograms"),
+    ([weight_measurement(0), weight_measurement(20)], "No free allowance"),
+])
+def test_weight_info(measurements, info):
+    assert agent.baggage_weight_info(measurements) == info
+
+
+def terms(*allowances):
+    return agent.index_by_id([{"id": "T0", "BaggageAllowance": list(allowances)}])
+
+
+def allowance(baggage_type, *items, airline="QR"):
+    return {"baggageType": baggage_type, "validatingAirlineCode": airline, "BaggageItem": list(items)}
+
+
+def item(included, *weights, text=None):
+    bag = {"includedInOfferPrice": included, "Measurement": [weight_measurement(value) for value in weights]}
+    if text is not None:
+        bag["Text"] = text
+    return bag
+
+
+@pytest.mark.parametrize("terms_by_id, summary", [
+    (terms(allowance("FirstCheckedBag", item("Yes", 30, text="CHGS MAY APPLY IF BAGS EXCEED TTL WT ALLOWANCE")),
+           allowance("CarryOn", item("Yes", 7, text="1 PIECE")),
+           allowance("CarryOn", item("Yes", 7, text="1 PIECE"))),
+     "1st bag: 30 Kilograms included; Carry-on: 7 Kilograms; 1 PIECE"),
+    (terms(allowance("FirstCheckedBag", item("No", 0))), "1st bag: No free allowance (fee applies)"),
+    (terms(allowance("FirstCheckedBag", item("Yes"))), "1st bag: Included"),
+    (terms(allowance("FirstCheckedBag", item("Yes", 23, 32))), "1st bag: 23 Kilograms included"),
+    (terms(allowance("CarryOn", item("Yes", 0))), "Carry-on: Standard allowance"),
+    (terms(allowance("SecondCheckedBag", item("No", 23, text="UPTO50LB 23KG"))), "UPTO50LB 23KG"),
+    (terms(allowance("Other", item("No"), airline="EK")), "Check Emirates policy"),
+    (terms(), "Check with airline"),
+])
+def test_known_summaries(terms_by_id, summary):
+    assert agent.extract_baggage_allowance("T0", terms_by_id) == summary
+
+
+def test_unknown_terms_reference():
+    assert agent.extract_baggage_allowance("T9", terms()) == "Check with airline"
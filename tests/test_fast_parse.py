@@ -0,0 +1,104 @@
+"""
+Table-driven tests for the deterministic fast-path parser (try_fast_parse), which decides
+when a message is simple enough to skip the LLM
+"""
+
+from datetime import date, datetime
+
+import pytest
+
+import app.agents.flight_booking_agent as agent
+
+
+class FrozenDate(date):
+    @classmethod
+    def today(cls):
+        return cls(2025, 8, 10)
+
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2025, 8, 10, 12, 0)
+
+
+@pytest.fixture(autouse=True)
+def frozen_today(monkeypatch):
+    monkeypatch.setattr(agent, "date", FrozenDate)
+    monkeypatch.setattr(agent, "datetime", FrozenDatetime)
+
+
+@pytest.mark.parametrize("message, from_city, to_city, departure_date", [
+    ("KHI to DXB on 2025-09-15", "KHI", "DXB", "2025-09-15"),
+    ("Karachi to Dubai 15th september", "KHI", "DXB", "2025-09-15"),
+    ("flights from lahore to london on 12 aug", "LHE", "LON", "2025-08-12"),
+    ("abu dhabi to karachi 1st october ✈️", "AUH", "KHI", "2025-10-01"),
+    ("please fly from karachi to dubai on the 15th september.", "KHI", "DXB", "2025-09-15"),
+    # Day-month dates that have passed roll over to next year
+    ("KHI to DXB 15th july", "KHI", "DXB", "2026-07-15"),
+    ("lahore to london on 3 aug", "LHE", "LON", "2026-08-03"),
+])
+def test_single_date_requests(message, from_city, to_city, departure_date):
+    parsed = agent.try_fast_parse(message)
+    
+    assert parsed is not None
+    assert (parsed["from_city"], parsed["to_city"], parsed["departure_date"]) == (from_city, to_city, departure_date)
+    assert parsed["search_type"] == "specific"
+    assert parsed["trip_type"] == "one-way"
+    assert parsed["return_date"] is None
+
+
+@pytest.mark.parametrize("message, from_city, to_city, range_start, range_end", [
+    ("ATH to ISB between 15th and 20th August", "ATH", "ISB", "2025-08-15", "2025-08-20"),
+    ("from athens to islamabad between 3 to 9 dec", "ATH", "ISB", "2025-12-03", "2025-12-09"),
+    ("KHI to DXB one-way between 1st and 5th september please", "KHI", "DXB", "2025-09-01", "2025-09-05"),
+    # Ranges that have already ended roll over to next year
+    ("KHI to DXB between 1st and 5th august", "KHI", "DXB", "2026-08-01", "2026-08-05"),
+    # A range that has already started keeps only the days from today on
+    ("KHI to DXB between 5th and 20th august", "KHI", "DXB", "2025-08-10", "2025-08-20"),
+])
+def test_date_range_requests(message, from_city, to_city, range_start, range_end):
+    parsed = agent.try_fast_parse(message)
+    
+    assert parsed is not None
+    assert (parsed["from_city"], parsed["to_city"]) == (from_city, to_city)
+    assert (parsed["date_range_start"], parsed["date_range_end"]) == (range_start, range_end)
+    assert parsed["search_type"] == "range"
+    assert parsed["departure_date"] is None
+
+
+@pytest.mark.parametrize("message", [
+    # Cue words that need the LLM
+    "KHI to DXB 15 september and back",
+    "KHI to DXB return 15 september",
+    "KHI to DXB 15 september for adults only",
+    "KHI to DXB 15 september with my kids",
+    "KHI to DXB tomorrow",
+    # Extra numbers (passenger counts, second dates, flight numbers...)
+    "KHI to DXB 15 september 2 of us",
+    "KHI to DXB 15 september flight 302",
+    "ATH to ISB between 15th and 20th August 2 seats",
+    # Words outside the route, the dates and the filler whitelist
+    "ATH to ISB between 15th and 20th August for me and my wife",
+    "ATH to ISB between 15th and 20th August business class",
+    "athens or rome to ISB between 15th and 20th August",
+    "karachi to dubai or doha on 15th november",
+    "karachi to dubai 15 november for me and my wife",
+    "khi to dxb 15 nov one-way with my son",
+    "london to paris 15 november business class",
+    "on 15 november karachi to dubai",
+    # Unknown month words
+    "KHI to DXB 15 sept",
+    "ATH to ISB between 15th and 20th augst",
+    # Invalid, reversed or past dates
+    "KHI to DXB 31st february",
+    "ATH to ISB between 20th and 15th August",
+    "KHI to DXB on 2025-08-01",
+    # Unknown or identical cities, or no date at all
+    "Karachi to Gotham 15 september",
+    "KHI to karachi 15 september",
+    "KHI to DXB next month",
+    "KHI to DXB",
+])
+def test_bails_out_to_the_llm(message):
+    assert agent.try_fast_parse(message) is None
@@ -0,0 +1,25 @@
+"""
+Tests for parse_iso_duration, including malformed segment values that must fall back to 0
+"""
+
+import pytest
+
+import app.agents.flight_booking_agent as agent
+
+
+@pytest.mark.parametrize("duration, minutes", [
+    ("PT3H40M", 220),
+    ("PT45M", 45),
+    ("PT2H", 120),
+    ("PT0H0M", 0),
+    ("P1D", 0),
+    ("", 0),
+    ("garbage", 0),
+])
+def test_parses_hours_and_minutes(duration, minutes):
+    assert agent.parse_iso_duration(duration) == minutes
+
+
+@pytest.mark.parametrize("duration", [None, 220, {"value": "PT3H"}, ["PT3H"]])
+def test_non_string_values_fall_back_to_zero(duration):
+    assert agent.parse_iso_duration(duration) == 0
@@ -0,0 +1,90 @@
+"""
+Tests for LLM reply handling in parse_travel_request: the ParsedTravelRequest schema must
+tolerate odd optional values instead of failing the whole parse
+"""
+
+import json
+
+import pytest
+
+import app.agents.flight_booking_agent as agent
+from app.models.schemas import ParsedTravelRequest
+
+
+@pytest.mark.parametrize("field, value, expected", [
+    ("duration_days", "5 days", 5),
+    ("duration_days", 5.5, 5),
+    ("duration_days", "a week or so", None),
+    ("duration_days", None, None),
+    ("passengers", "2 adults", 2),
+    ("passengers", 2.0, 2),
+    ("passengers", "number of passengers (default 1)", 1),
+    ("passengers", None, 1),
+    ("passenger_age", "30 years", 30),
+    ("passenger_age", [], 25),
+    ("from_city", ["KHI", "LHE"], None),
+    ("range_description", 2025, "2025"),
+])
+def test_odd_values_are_coerced_or_dropped(field, value, expected):
+    parsed = ParsedTravelRequest.model_validate_json(json.dumps({"from_city": "KHI", field: value}))
+    
+    assert getattr(parsed, field) == expected
+
+
+def test_missing_fields_take_defaults():
+    parsed = ParsedTravelRequest.model_validate_json('{"from_city": "KHI", "to_city": "DXB", "extra": true}')
+    
+    assert parsed.model_dump() == {
+        "from_city": "KHI", "to_city": "DXB", "departure_date": None, "return_date": None,
+        "passengers": 1, "passenger_age": 25, "search_type": "specific", "trip_type": "one-way",
+        "duration_days": None, "date_range_start": None, "date_range_end": None, "range_description": None,
+    }
+
+
+class Chunk:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeLLM:
+    """Streams a canned reply in small chunks, like the Gemini client"""
+    
+    def __init__(self, reply):
+        self.reply = reply
+    
+    def stream(self, messages):
+        for i in range(0, len(self.reply), 8):
+            yield Chunk(self.reply[i:i + 8])
+
+
+@pytest.fixture
+def llm_reply(monkeypatch):
+    def install(reply):
+        monkeypatch.setattr(agent, "llm", FakeLLM(reply))
+    
+    agent._parse_cache.clear()
+    yield install
+    agent._parse_cache.clear()
+
+
+def test_fuzzy_optional_values_still_produce_a_search(llm_reply):
+    llm_reply("""```json
+    {"from_city": "KHI", "to_city": "DXB", "departure_date": "2025-09-01", "return_date": null,
+     "passengers": "2 adults", "trip_type": "round-trip", "duration_days": "5 days", "search_type": "specific"}
+    ```""")
+    
+    state = agent.parse_travel_request({"user_message": "karachi to dubai 1st sept, 5 days, me and my wife"})
+    
+    assert "response_text" not in state
+    assert (state["from_city"], state["to_city"]) == ("KHI", "DXB")
+    assert state["passengers"] == 2
+    assert state["duration_days"] == 5
+    assert state["return_date"] == "2025-09-06"
+
+
+def test_unreadable_reply_asks_the_user_again(llm_reply):
+    llm_reply("Sorry, I can't help with that.")
+    
+    state = agent.parse_travel_request({"user_message": "hello there"})
+    
+    assert "couldn't understand" in state["response_text"]
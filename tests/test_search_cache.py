@@ -0,0 +1,178 @@
+"""
+Tests for the shared catalog search cache: hits return the cached response, concurrent identical
+misses share one API call, and the analysis path that reads a cached response never changes it
+(the object is shared between conversations)
+"""
+
+import copy
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app.agents.flight_booking_agent as agent
+
+
+def catalog_response(price="512.40"):
+    """One-way KHI→DXB catalog response with a single priced offering"""
+    return {
+        "CatalogProductOfferingsResponse": {
+            "transactionId": "tx-1",
+            "CatalogProductOfferings": {
+                "CatalogProductOffering": [{
+                    "id": "o1",
+                    "Departure": "KHI",
+                    "Arrival": "DXB",
+                    "ProductBrandOptions": [{
+                        "flightRefs": ["s1"],
+                        "ProductBrandOffering": [{
+                            "BestCombinablePrice": {"TotalPrice": price, "CurrencyCode": {"value": "EUR"}},
+                            "TermsAndConditions": {"termsAndConditionsRef": "T0"},
+                            "Brand": {"BrandRef": "b1"},
+                            "Product": [{"productRef": "p1"}]
+                        }]
+                    }]
+                }]
+            },
+            "ReferenceList": [
+                {"@type": "ReferenceListFlight", "Flight": [{
+                    "id": "s1", "carrier": "EK", "number": "601", "duration": "PT2H10M",
+                    "Departure": {"location": "KHI", "date": "2025-09-15", "time": "04:30:00"},
+                    "Arrival": {"location": "DXB", "date": "2025-09-15", "time": "05:40:00"}
+                }]},
+                {"@type": "ReferenceListTermsAndConditions", "TermsAndConditions": [{
+                    "id": "T0", "BaggageAllowance": [{
+                        "baggageType": "FirstCheckedBag", "validatingAirlineCode": "EK",
+                        "BaggageItem": [{
+                            "includedInOfferPrice": "Yes",
+                            "Measurement": [{"measurementType": "Weight", "value": 30, "unit": "Kilograms"}]
+                        }]
+                    }]
+                }]}
+            ]
+        }
+    }
+
+
+SEARCH = ("KHI", "DXB", "2025-09-15", None, 1, 25, {})
+
+
+@pytest.fixture
+def fetch_calls(monkeypatch):
+    """Replace the API call with a canned response and record each call"""
+    calls = []
+    
+    def fake_fetch(*args):
+        calls.append(args)
+        return catalog_response()
+    
+    monkeypatch.setattr(agent, "SEARCH_CACHE_DISABLED", False)
+    monkeypatch.setattr(agent, "fetch_catalog_search", fake_fetch)
+    # Keep quote references out of the real conversation memory store
+    monkeypatch.setattr(agent, "remember_quote_reference", lambda state, code: state.update(quote_reference=code))
+    agent._search_cache.clear()
+    yield calls
+    agent._search_cache.clear()
+
+
+def test_identical_search_is_served_from_the_cache(fetch_calls):
+    first = agent.search_catalog_cached(*SEARCH)
+    second = agent.search_catalog_cached(*SEARCH)
+    
+    assert len(fetch_calls) == 1
+    assert first == catalog_response()
+    assert second == catalog_response()
+
+
+def test_different_searches_are_cached_separately(fetch_calls):
+    agent.search_catalog_cached(*SEARCH)
+    agent.search_catalog_cached("KHI", "DXB", "2025-09-16", None, 1, 25, {})
+    
+    assert len(fetch_calls) == 2
+
+
+def test_analysis_leaves_the_cached_response_unchanged(fetch_calls):
+    cached = agent.search_catalog_cached(*SEARCH)
+    snapshot = copy.deepcopy(cached)
+    
+    # Two conversations analyse the same cached object
+    for user_id in ("user-a", "user-b"):
+        state = {"from_city": "KHI", "to_city": "DXB", "user_id": user_id,
+                 "raw_api_response": agent.search_catalog_cached(*SEARCH)}
+        state = agent.find_cheapest_flight(state)
+        assert "512.4" in state["response_text"]
+    
+    assert len(fetch_calls) == 1
+    assert cached == snapshot
+    assert agent.search_catalog_cached(*SEARCH) == snapshot
+
+
+def test_users_sharing_a_cached_search_get_different_quote_references(fetch_calls):
+    references = []
+    for user_id in ("user-a", "user-b", "user-a"):
+        state = {"from_city": "KHI", "to_city": "DXB", "user_id": user_id,
+                 "raw_api_response": agent.search_catalog_cached(*SEARCH)}
+        state = agent.find_cheapest_flight(state)
+        references.append(state["quote_reference"])
+    
+    assert len(fetch_calls) == 1
+    assert len(set(references)) == 3
+    assert all(re.fullmatch(r"TT-[0-9A-F]{8}", reference) for reference in references)
+
+
+def test_concurrent_misses_share_one_in_flight_call(monkeypatch):
+    release = threading.Event()
+    calls = []
+    
+    def slow_fetch(*args):
+        calls.append(args)
+        release.wait(5)
+        return catalog_response()
+    
+    monkeypatch.setattr(agent, "SEARCH_CACHE_DISABLED", False)
+    monkeypatch.setattr(agent, "fetch_catalog_search", slow_fetch)
+    agent._search_cache.clear()
+    
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(agent.search_catalog_cached, *SEARCH) for _ in range(4)]
+        # Let every caller reach the cache/in-flight check before the one fetch completes
+        while not agent._search_inflight:
+            time.sleep(0.01)
+        time.sleep(0.1)
+        release.set()
+        results = [future.result(timeout=5) for future in futures]
+    
+    agent._search_cache.clear()
+    assert len(calls) == 1
+    assert all(result == catalog_response() for result in results)
+    assert not agent._search_inflight
+
+
+def test_in_flight_failure_reaches_every_waiter_and_is_not_cached(monkeypatch):
+    release = threading.Event()
+    calls = []
+    
+    def failing_fetch(*args):
+        calls.append(args)
+        release.wait(5)
+        raise RuntimeError("catalog search failed")
+    
+    monkeypatch.setattr(agent, "SEARCH_CACHE_DISABLED", False)
+    monkeypatch.setattr(agent, "fetch_catalog_search", failing_fetch)
+    agent._search_cache.clear()
+    
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(agent.search_catalog_cached, *SEARCH) for _ in range(3)]
+        while not agent._search_inflight:
+            time.sleep(0.01)
+        time.sleep(0.1)
+        release.set()
+        for future in futures:
+            with pytest.raises(RuntimeError):
+                future.result(timeout=5)
+    
+    assert len(calls) == 1
+    assert len(agent._search_cache) == 0
+    assert not agent._search_inflight
@@ -0,0 +1,26 @@
+"""
+Known cases for calculate_time_difference (field splitting + date.toordinal)
+"""
+
+import pytest
+
+import app.agents.flight_booking_agent as agent
+
+
+@pytest.mark.parametrize("date1, time1, date2, time2, minutes", [
+    ("2025-08-10", "11:00:00", "2025-08-10", "14:30:00", 210),
+    ("2025-08-10", "23:15:00", "2025-08-11", "01:05:00", 110),
+    ("2024-02-28", "22:00:00", "2024-03-01", "02:00:00", 1680),  # leap day in between
+    ("2024-12-31", "23:00:00", "2025-01-01", "01:00:00", 120),   # year boundary
+    ("2025-08-10", "11:00:59", "2025-08-10", "11:01:00", 0),     # partial minutes are dropped
+    ("2025-08-10", "14:30:00", "2025-08-10", "11:00:00", 0),     # negative gaps clamp to zero
+    ("2025-08-10", "25:00:00", "2025-08-10", "11:00:00", None),
+    ("2025-08-10", "10:60:00", "2025-08-10", "11:00:00", None),
+    ("2025-08-10", "10:00", "2025-08-10", "11:00:00", None),
+    ("2025-02-29", "10:00:00", "2025-03-01", "11:00:00", None),
+    ("2025-13-01", "10:00:00", "2025-08-10", "11:00:00", None),
+    ("2025/08/10", "10:00:00", "2025-08-10", "11:00:00", None),
+    ("garbage", "10:00:00", "2025-08-10", "11:00:00", None),
+])
+def test_known_differences(date1, time1, date2, time2, minutes):
+    assert agent.calculate_time_difference(date1, time1, date2, time2) == minutes